@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, m2m_changed
 
 
 def set_price(sender, instance, **kwargs):
@@ -15,14 +15,68 @@ def set_price(sender, instance, **kwargs):
         Case.objects.filter(pk=instance.pk).update(price=instance.recommendation_price)
 
 
+def invalidate_case_drop_table(sender, instance, **kwargs):
+    from cases.drop_table import invalidate_case
+
+    invalidate_case(instance.case_id)
+
+
+def invalidate_case_items_drop_table(sender, instance, action, reverse, **kwargs):
+    from cases.drop_table import invalidate_case, invalidate_all
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # изменили список кейсов со стороны предмета
+        invalidate_all()
+        return
+    invalidate_case(instance.case_id)
+
+
+def invalidate_all_drop_tables(sender, **kwargs):
+    from cases.drop_table import invalidate_all
+
+    invalidate_all()
+
+
+def invalidate_case_details(sender, **kwargs):
+    from cases.case_cache import invalidate_case_details
+
+    invalidate_case_details()
+
+
+def invalidate_case_items_details(sender, action, **kwargs):
+    from cases.case_cache import invalidate_case_details
+
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_case_details()
+
+
 class CasesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cases"
 
     def ready(self):
-        from cases.models import Case
+        from cases.models import Case, Item, RarityCategory, Category
+        from cases.pricing import prices_changed
+        from core.models import GenericSettings
 
         post_save.connect(
             set_price,
             sender=Case,
         )
+
+        post_save.connect(invalidate_case_drop_table, sender=Case)
+        post_save.connect(invalidate_all_drop_tables, sender=Item)
+        post_save.connect(invalidate_all_drop_tables, sender=GenericSettings)
+        m2m_changed.connect(
+            invalidate_case_items_drop_table,
+            sender=Case.items.through,
+        )
+
+        for model in (Case, Item, RarityCategory, Category, GenericSettings):
+            post_save.connect(invalidate_case_details, sender=model)
+        m2m_changed.connect(invalidate_case_items_details, sender=Case.items.through)
+
+        prices_changed.connect(invalidate_all_drop_tables)
+        prices_changed.connect(invalidate_case_details)
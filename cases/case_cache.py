@@ -0,0 +1,96 @@
+"""Кэш страницы кейса.
+
+В Redis хранится готовый ответ CasesViewSet.retrieve: предметы с процентами,
+ссылки на картинки и редкости. Ключ -- translit_name кейса, вместе с ответом
+лежит номер версии. Любое изменение кейсов, предметов, редкостей или настроек
+увеличивает версию, после чего кэш пересобирается в фоне задачей
+rebuild_case_details. Чтение -- один MGET без запросов в базу.
+"""
+
+import json
+
+import redis
+from django.db.models import Q
+
+from utils.redis_client import get_redis
+
+CASE_DETAIL_KEY = "case_detail:{translit_name}"
+CASE_DETAIL_VERSION_KEY = "case_detail_version"
+CASE_DETAIL_TTL = 60 * 60
+# пачка изменений (например, пересчёт цен всех предметов) ставит одну пересборку
+REBUILD_DEBOUNCE = 10
+
+
+def _key(translit_name: str) -> str:
+    return CASE_DETAIL_KEY.format(translit_name=translit_name)
+
+
+def get_case_detail(translit_name: str) -> dict | None:
+    """Готовый ответ по кейсу или None, если кэша нет или он устарел"""
+    try:
+        version, payload = get_redis().mget(
+            CASE_DETAIL_VERSION_KEY, _key(translit_name)
+        )
+    except redis.RedisError:
+        return None
+    if payload is None:
+        return None
+    payload = json.loads(payload)
+    if payload["version"] != int(version or 0):
+        return None
+    return payload["data"]
+
+
+def build_case_detail(case, version: int = None) -> dict:
+    """Сериализует кейс и кладёт его в кэш под текущей версией"""
+    from cases.serializers import CaseSerializer
+
+    client = get_redis()
+    try:
+        if version is None:
+            version = int(client.get(CASE_DETAIL_VERSION_KEY) or 0)
+    except redis.RedisError:
+        version = None
+
+    data = CaseSerializer(case).data
+    if version is not None:
+        payload = json.dumps({"version": version, "data": data})
+        try:
+            client.set(_key(case.translit_name), payload, ex=CASE_DETAIL_TTL)
+        except redis.RedisError:
+            pass
+    return data
+
+
+def rebuild_case_details() -> int:
+    from cases.models import Case
+
+    client = get_redis()
+    version = int(client.get(CASE_DETAIL_VERSION_KEY) or 0)
+    cases = Case.objects.filter(active=True, removed=False).select_related("category")
+    count = 0
+    for case in cases:
+        build_case_detail(case, version)
+        count += 1
+
+    # скрытые кейсы не должны отдаваться из кэша до истечения TTL
+    hidden = Case.objects.filter(Q(active=False) | Q(removed=True)).values_list(
+        "translit_name", flat=True
+    )
+    keys = [_key(name) for name in hidden if name]
+    for start in range(0, len(keys), 500):
+        client.delete(*keys[start : start + 500])
+    return count
+
+
+def invalidate_case_details():
+    """Сбрасывает кэш всех кейсов и ставит фоновую пересборку"""
+    from django.core.cache import cache
+    from cases.tasks import rebuild_case_details_task
+
+    try:
+        get_redis().incr(CASE_DETAIL_VERSION_KEY)
+    except redis.RedisError:
+        return
+    if cache.add("case_detail_rebuild_scheduled", True, REBUILD_DEBOUNCE):
+        rebuild_case_details_task.apply_async(countdown=REBUILD_DEBOUNCE)
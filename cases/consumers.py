@@ -1,16 +1,27 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.conf import settings
-import asyncio
-import aioredis
 import json
 
+from cases.live_tape import LIVE_TAPE_GROUP, get_last_items, get_luxury_item
+from utils.redis_client import get_async_redis
+
 
 class LiveTapeConsumer(AsyncWebsocketConsumer):
+    """Лайв лента.
+    Новые предметы рассылаются всем подключённым через группу channel layer,
+    get_items и get_luxury_item отдают текущее состояние ленты при подключении
+    """
+
     async def connect(self):
+        await self.channel_layer.group_add(LIVE_TAPE_GROUP, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
-        return super().disconnect(close_code)
+        await self.channel_layer.group_discard(LIVE_TAPE_GROUP, self.channel_name)
+
+    async def live_tape_items(self, event):
+        await self.send(
+            text_data=json.dumps({"action": "new_items", "items": event["items"]})
+        )
 
     async def receive(self, text_data):
         data = json.loads(text_data)
@@ -19,35 +30,17 @@ class LiveTapeConsumer(AsyncWebsocketConsumer):
             await self.send(json.dumps({"message": "error, not found 'action'"}))
             return
 
-        r = aioredis.from_url(settings.REDIS_CONNECTION_STRING)
-
-        list_key = "live_tape"
+        r = get_async_redis()
 
         if data["action"] == "get_items":
-            items = list(
-                reversed(
-                    [
-                        json.loads(i.decode("utf-8"))
-                        for i in await r.lrange(list_key, -19, -1)
-                    ]
-                )
-            )
+            items = await get_last_items(r)
             await self.send(text_data=json.dumps(items))
             return
 
         if data["action"] == "get_luxury_item":
-            items = list(
-                reversed(
-                    [
-                        json.loads(i.decode("utf-8"))
-                        for i in await r.lrange(list_key, 0, -1)
-                    ]
-                )
-            )
-            items = sorted(items, key=lambda x: x["price"], reverse=True)
-            if not items:
+            luxury_item = await get_luxury_item(r)
+            if not luxury_item:
                 await self.send(text_data=json.dumps({"message": "item not found"}))
                 return
-            luxury_item = items[0]
             await self.send(text_data=json.dumps(luxury_item))
             return
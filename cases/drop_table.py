@@ -0,0 +1,136 @@
+"""Скомпилированные таблицы выпадения предметов из кейсов.
+
+Таблица строится один раз на кейс по purchase_price_cached и хранится в памяти
+процесса. Пересборка происходит только при смене версии: изменились предметы
+кейса, цены предметов или GenericSettings. Версии лежат в общем кэше, поэтому
+изменение в одном процессе инвалидирует таблицы во всех остальных.
+"""
+
+import random
+
+from django.core.cache import cache
+
+from utils.functions import id_generator
+
+GLOBAL_VERSION_KEY = "drop_table_version"
+CASE_VERSION_KEY = "drop_table_version_{case_id}"
+
+_tables = {}
+
+
+class AliasSampler:
+    """Выбор индекса с учётом весов за O(1), метод алиасов (Walker/Vose)"""
+
+    def __init__(self, weights: list[float]):
+        size = len(weights)
+        total = sum(weights)
+        self.prob = [1.0] * size
+        self.alias = list(range(size))
+
+        scaled = [weight * size / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+    def sample(self) -> int:
+        index = random.randrange(len(self.prob))
+        if random.random() < self.prob[index]:
+            return index
+        return self.alias[index]
+
+
+class DropTable:
+    """Таблица выпадения кейса.
+
+    Вес предмета -- 1 / закупочная цена. Предметы разбиты на две группы:
+    дороже кейса и остальные. Индивидуальный процент пользователя умножает вес
+    группы дорогих предметов на (1 + individual_percent), поэтому пересчёт под
+    пользователя сводится к выбору группы, а не к перестройке всей таблицы.
+    """
+
+    def __init__(self, case_price: float, items: list, prices: list[float], version):
+        self.version = version
+        self.items = items
+        self.prices = prices
+        self.weights = [1 / price for price in prices]
+
+        total = sum(self.weights)
+        self.percents = [weight / total for weight in self.weights]
+
+        self.win_ids = [i for i, price in enumerate(prices) if price > case_price]
+        self.lose_ids = [i for i, price in enumerate(prices) if price <= case_price]
+        self.win_weight = sum(self.weights[i] for i in self.win_ids)
+        self.lose_weight = sum(self.weights[i] for i in self.lose_ids)
+
+        self.win_sampler = (
+            AliasSampler([self.weights[i] for i in self.win_ids])
+            if self.win_ids
+            else None
+        )
+        self.lose_sampler = (
+            AliasSampler([self.weights[i] for i in self.lose_ids])
+            if self.lose_ids
+            else None
+        )
+
+    def sample(self, individual_percent: float = 0) -> int:
+        """Возвращает индекс выпавшего предмета"""
+        win_weight = self.win_weight
+        if individual_percent != 0:
+            win_weight = self.win_weight * (1 + individual_percent)
+        total = win_weight + self.lose_weight
+        if total <= 0:
+            # individual_percent = -1 при кейсе только из дорогих предметов
+            win_weight = self.win_weight
+            total = self.win_weight + self.lose_weight
+
+        if random.random() * total < win_weight:
+            return self.win_ids[self.win_sampler.sample()]
+        return self.lose_ids[self.lose_sampler.sample()]
+
+
+def _case_version_key(case_id: str) -> str:
+    return CASE_VERSION_KEY.format(case_id=case_id)
+
+
+def invalidate_case(case_id: str):
+    cache.set(_case_version_key(case_id), id_generator(), None)
+
+
+def invalidate_all():
+    cache.set(GLOBAL_VERSION_KEY, id_generator(), None)
+
+
+def build_drop_table(case, version=None) -> DropTable:
+    items = list(case.items.select_related("rarity_category"))
+    # предметы без закупочной цены в базе считаем один раз при сборке таблицы
+    prices = [
+        (
+            item.purchase_price_cached
+            if item.purchase_price_cached > 0
+            else item.purchase_price
+        )
+        for item in items
+    ]
+    return DropTable(case.price, items, prices, version)
+
+
+def get_drop_table(case) -> DropTable:
+    case_key = _case_version_key(case.case_id)
+    versions = cache.get_many([GLOBAL_VERSION_KEY, case_key])
+    version = (versions.get(GLOBAL_VERSION_KEY), versions.get(case_key), case.price)
+
+    table = _tables.get(case.case_id)
+    if table is None or table.version != version:
+        table = build_drop_table(case, version)
+        _tables[case.case_id] = table
+    return table
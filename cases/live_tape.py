@@ -0,0 +1,86 @@
+"""Лайв лента.
+
+Лента -- sorted set LIVE_TAPE_KEY по времени выпадения, рядом с ней индекс
+LUXURY_KEY по цене. Запись, чистка устаревших предметов и ограничение размера
+идут Lua-скриптами, поэтому лента и индекс меняются атомарно. Устаревшие
+предметы удаляются одним ZREMRANGEBYSCORE, самый дорогой предмет за сутки --
+один ZREVRANGE.
+"""
+
+import json
+import time
+
+LIVE_TAPE_KEY = "live_tape:feed"
+LIVE_TAPE_GROUP = "live_tape"
+LUXURY_KEY = "live_tape:luxury"
+# лента до перехода на sorted set
+LEGACY_LIST_KEY = "live_tape"
+LIVE_TAPE_TTL = 24 * 60 * 60
+# жёсткий предел размера ленты на случай всплеска открытий
+LIVE_TAPE_MAX_ITEMS = 10000
+LIVE_TAPE_PAGE = 19
+
+# KEYS: LIVE_TAPE_KEY, LUXURY_KEY; ARGV: граница устаревания, предел размера
+_TRIM = """
+local function drop(members)
+    for i = 1, #members, 1000 do
+        redis.call('ZREM', KEYS[2], unpack(members, i, math.min(i + 999, #members)))
+    end
+end
+drop(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1]))
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local overflow = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[2])
+if overflow > 0 then
+    drop(redis.call('ZRANGE', KEYS[1], 0, overflow - 1))
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, overflow - 1)
+end
+"""
+
+# ARGV после первых двух: тройки (предмет, цена, время)
+WRITE_SCRIPT = (
+    """
+for i = 3, #ARGV, 3 do
+    redis.call('ZADD', KEYS[1], ARGV[i + 2], ARGV[i])
+    redis.call('ZADD', KEYS[2], ARGV[i + 1], ARGV[i])
+end
+"""
+    + _TRIM
+)
+
+LUXURY_SCRIPT = (
+    _TRIM
+    + """
+return redis.call('ZREVRANGE', KEYS[2], 0, 0)[1]
+"""
+)
+
+
+def _trim_args() -> list:
+    return [time.time() - LIVE_TAPE_TTL, LIVE_TAPE_MAX_ITEMS]
+
+
+def write_items(client, items: list[dict]):
+    """Пишет предметы в ленту и индекс одним вызовом скрипта"""
+    args = _trim_args()
+    for item in items:
+        args += [json.dumps(item), item["price"], item["timestamp"]]
+    client.eval(WRITE_SCRIPT, 2, LIVE_TAPE_KEY, LUXURY_KEY, *args)
+
+
+def trim(client):
+    """Удаляет устаревшие предметы и лишнее сверх предела размера"""
+    client.eval(_TRIM, 2, LIVE_TAPE_KEY, LUXURY_KEY, *_trim_args())
+
+
+async def get_last_items(client) -> list[dict]:
+    """Последние предметы ленты, новые первыми"""
+    items = await client.zrevrange(LIVE_TAPE_KEY, 0, LIVE_TAPE_PAGE - 1)
+    return [json.loads(item) for item in items]
+
+
+async def get_luxury_item(client) -> dict | None:
+    """Самый дорогой предмет ленты за последние сутки"""
+    item = await client.eval(LUXURY_SCRIPT, 2, LIVE_TAPE_KEY, LUXURY_KEY, *_trim_args())
+    if item is None:
+        return None
+    return json.loads(item)
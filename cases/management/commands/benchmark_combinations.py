@@ -0,0 +1,70 @@
+import random
+import time
+
+from django.core.management import BaseCommand
+
+from payments.models import CompositeItems
+from utils.functions import find_combination, CombinationSolver
+
+# номиналы кристаллов и цены в долларах, если в базе нет составных предметов
+DEFAULT_COSTS = {
+    60: 0.99,
+    330: 4.99,
+    1090: 14.99,
+    2240: 29.99,
+    3880: 49.99,
+    8080: 99.99,
+}
+
+
+class Command(BaseCommand):
+    help = "Сравнение find_combination и CombinationSolver на случайных целях"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--targets", type=int, default=1000)
+        parser.add_argument("--max-target", type=int, default=20000)
+        parser.add_argument("--default-costs", action="store_true")
+
+    def handle(self, *args, **options):
+        costs = DEFAULT_COSTS
+        if not options["default_costs"]:
+            composites = CompositeItems.objects.filter(
+                type=CompositeItems.CRYSTAL, removed=False
+            )
+            costs = {
+                i.crystals_quantity: i.price_dollar
+                for i in composites
+                if i.crystals_quantity
+            } or DEFAULT_COSTS
+        values = sorted(costs)
+
+        targets = [
+            random.randint(1, options["max_target"]) for _ in range(options["targets"])
+        ]
+
+        started = time.perf_counter()
+        old_cost = 0.0
+        for target in targets:
+            old_cost += sum(costs[i] for i in find_combination(target, values))
+        old_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        solver = CombinationSolver(costs)
+        build_cost = 0.0
+        for target in targets:
+            build_cost += solver.cost(target)
+        new_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for target in targets:
+            solver.solve(target)
+        warm_time = time.perf_counter() - started
+
+        self.stdout.write(f"Номиналы: {values}, целей: {len(targets)}")
+        self.stdout.write(
+            f"find_combination: {old_time:.4f} с, стоимость наборов {old_cost:.2f}$"
+        )
+        self.stdout.write(
+            f"CombinationSolver: {new_time:.4f} с с построением таблицы, "
+            f"{warm_time:.4f} с на готовой таблице, стоимость наборов {build_cost:.2f}$"
+        )
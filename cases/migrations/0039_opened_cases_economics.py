@@ -0,0 +1,67 @@
+# Generated by Django 4.2.9 on 2026-10-18 10:46
+
+from django.db import migrations, models
+from django.db.models import Case, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+# открытия обновляются диапазонами id, чтобы не держать блокировку всей таблицы
+BATCH_SIZE = 50000
+
+
+def fill_opened_cases(apps, schema_editor):
+    """Цены на момент открытия не сохранялись, берутся текущие цена кейса
+    и сохранённая закупочная цена предмета"""
+    OpenedCases = apps.get_model("cases", "OpenedCases")
+    CaseModel = apps.get_model("cases", "Case")
+    Item = apps.get_model("cases", "Item")
+    UserProfile = apps.get_model("users", "UserProfile")
+
+    case_price = CaseModel.objects.filter(case_id=OuterRef("case_id")).values(
+        price_paid=Case(When(case_free=True, then=Value(0.0)), default="price")
+    )
+    item_cost = Item.objects.filter(id=OuterRef("item_id")).values(
+        "purchase_price_cached"
+    )
+    demo = UserProfile.objects.filter(user_id=OuterRef("user_id")).values("demo")
+
+    last_id = OpenedCases.objects.order_by("-id").values_list("id", flat=True).first()
+    for start in range(0, (last_id or 0) + 1, BATCH_SIZE):
+        OpenedCases.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+            case_price=Subquery(case_price),
+            item_cost=Subquery(item_cost),
+            demo=Coalesce(Subquery(demo), Value(False)),
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("cases", "0038_remove_item_percent_price_and_more"),
+        ("users", "0040_userprofile_real_balance_demo_balance"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="openedcases",
+            name="case_price",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Уплачено за кейс"
+            ),
+        ),
+        migrations.AddField(
+            model_name="openedcases",
+            name="demo",
+            field=models.BooleanField(default=False, verbose_name="Демо открытие"),
+        ),
+        migrations.AddField(
+            model_name="openedcases",
+            name="item_cost",
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                verbose_name="Закупочная цена предмета при открытии",
+            ),
+        ),
+        migrations.RunPython(fill_opened_cases, migrations.RunPython.noop),
+    ]
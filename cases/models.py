@@ -1,25 +1,22 @@
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.conf import settings
+from django.db import models, transaction
 from django.utils import timezone
 from colorfield.fields import ColorField
 from django.contrib.auth.models import User
 from django.utils.functional import cached_property
-from gateways.telegram_bot_func import is_member_chanel
+from core import counters, rollups
 from core.models import GenericSettings
-from random import choices
+from cases.drop_table import get_drop_table
+from cases import subscriptions
+from cases.pricing import get_pricing, purchase_price, purchase_prices
 from utils.functions import (
     id_generator,
     generate_upload_name,
     transliterate,
-    find_combination,
 )
 
 from social_django.models import UserSocialAuth
 
-import requests
-import json
-
 
 class Contests(models.Model):
     contest_id = models.CharField(
@@ -225,44 +222,10 @@ class Item(models.Model):
 
     @cached_property
     def purchase_price(self):
-        from payments.models import CompositeItems
-        from gateways.economia_api import get_currency
-
-        price = 0.0
-
-        composites = CompositeItems.objects.all()
+        return purchase_price(self)
 
-        crystal_composite = composites.filter(type=CompositeItems.CRYSTAL)
-        blessing_composite = composites.filter(type=CompositeItems.BLESSING).first()
-
-        if self.type == self.BLESSING:
-            price += blessing_composite.price_dollar
-
-        if self.type == self.CRYSTAL:
-            if self.crystals_quantity < 60:
-                price += self.crystals_quantity * 0.014
-            else:
-                value_set = [i.crystals_quantity for i in crystal_composite]
-                combination = self.get_crystal_combinations(value_set)
-                for com in combination:
-                    com_item = crystal_composite.filter(crystals_quantity=com).get()
-                    price += com_item.price_dollar
-
-        if self.type == self.GHOST_ITEM:
-            value_set = [i.crystals_quantity for i in crystal_composite]
-            combination = self.get_crystal_combinations(value_set)
-            for com in combination:
-                com_item = crystal_composite.filter(crystals_quantity=com).get()
-                price += com_item.price_dollar
-
-        if price == 0.0:
-            price += 0.1
-
-        currency = float(get_currency()["USDRUB"]["high"])
-        return round(price * currency, 2)
-
-    def get_crystal_combinations(self, value_set):
-        return find_combination(target=self.crystals_quantity, values=value_set)
+    def get_crystal_combinations(self):
+        return get_pricing().combination(self.crystals_quantity)
 
     def __str__(self):
         return self.name
@@ -390,7 +353,8 @@ class Case(models.Model):
             self.translit_name = transliterate(self.name)
         return super().save(*args, **kwargs)
 
-    def check_conditions(self, user: User) -> tuple[str, bool]:
+    def check_conditions(self, user: User, recheck: bool = False) -> tuple[str, bool]:
+        """recheck -- проверить подписки во внешних API, не читая кэш"""
         from payments.models import PaymentOrder
 
         if self.conditions.exists():
@@ -424,12 +388,11 @@ class Case(models.Model):
                             False,
                         )
 
-                    generic = GenericSettings.objects.first()
-
-                    is_member = is_member_chanel(
-                        chat_id=condition.group_id_tg,
-                        user_id=tg_id,
-                        token=generic.telegram_verify_bot_token,
+                    is_member = subscriptions.is_member(
+                        subscriptions.TELEGRAM,
+                        condition.group_id_tg,
+                        tg_id,
+                        force=recheck,
                     )
 
                     if not is_member:
@@ -450,15 +413,14 @@ class Case(models.Model):
 
                     vk_user_id = auth_vk.extra_data["id"]
 
-                    response = requests.get(
-                        f"https://api.vk.com/method/groups.isMember?group_id={condition.group_id_vk}&access_token={settings.VK_APP_ACCESS_TOKEN}&user_id={vk_user_id}&v=5.199"
-                    )
-
-                    user_in_group = int(
-                        json.loads(response.content.decode("utf-8"))["response"]
+                    user_in_group = subscriptions.is_member(
+                        subscriptions.VK,
+                        condition.group_id_vk,
+                        vk_user_id,
+                        force=recheck,
                     )
 
-                    if user_in_group == 0:
+                    if not user_in_group:
                         return (
                             "Для открытия этого кейса вам необходимо подписаться на все указанные группы vk.com",
                             False,
@@ -485,24 +447,33 @@ class Case(models.Model):
         """Возвращает json предметов с проставленными процентами"""
         generic = GenericSettings.load()
         items = self.items.values(
-            "item_id", "name", "price", "image", "rarity_category"
+            "item_id",
+            "name",
+            "price",
+            "image",
+            "rarity_category",
+            "type",
+            "crystals_quantity",
         )
+        pricing = get_pricing()
         # считаем коэффициент для айтемов todo запретить предметам без закупочной цены попадать в кейсы
         items_kfs = {
             item["item_id"]: 1
-            / Item.objects.filter(item_id=item["item_id"]).get().purchase_price
+            / pricing.purchase_price(item.pop("type"), item.pop("crystals_quantity"))
             for item in items
         }
         # из полученных коэффициентов выше считаем нормализацию
         normalise_kof = 1 / sum([items_kfs[item] for item in items_kfs])
 
+        rarities = RarityCategory.objects.in_bulk(
+            [item["rarity_category"] for item in items], field_name="rarity_id"
+        )
+
         # высчитываем дефолтный процент для каждого айтема
         for item in items:
             item["percent"] = normalise_kof * items_kfs[item["item_id"]] * 100
             item["image"] = f"https://{generic.domain_url}/media/" + item["image"]
-            item["rarity_category"] = RarityCategory.objects.filter(
-                rarity_id=item["rarity_category"]
-            ).first()
+            item["rarity_category"] = rarities.get(item["rarity_category"])
         return items
 
     def get_admin_items(self):
@@ -519,22 +490,29 @@ class Case(models.Model):
             "type",
             "created_at",
             "purchase_price_cached",
+            "crystals_quantity",
+            "rarity_category",
         )
+        pricing = get_pricing()
         # считаем коэффициент для айтемов todo запретить предметам без закупочной цены попадать в кейсы
         items_kfs = {
             item["item_id"]: 1
-            / Item.objects.filter(item_id=item["item_id"]).get().purchase_price
+            / pricing.purchase_price(item["type"], item.pop("crystals_quantity"))
             for item in items
         }
         # из полученных коэффициентов выше считаем нормализацию
         normalise_kof = 1 / sum([items_kfs[item] for item in items_kfs])
 
+        rarities = RarityCategory.objects.in_bulk(
+            [item["rarity_category"] for item in items], field_name="rarity_id"
+        )
+
         # высчитываем дефолтный процент для каждого айтема
         for item in items:
             item["percent"] = normalise_kof * items_kfs[item["item_id"]] * 100
             item["image"] = f"https://{generic.domain_url}/media/" + item["image"]
             item["rarity_category"] = RarityCategorySerializer(
-                Item.objects.get(id=item["id"]).rarity_category
+                rarities.get(item["rarity_category"])
             ).data
         return items
 
@@ -548,7 +526,7 @@ class Case(models.Model):
         #    items = items.exclude(purchase_price=0)
         if items.count() == 0:
             return 0
-        items_kfs = [1 / item.purchase_price for item in items]
+        items_kfs = [1 / price for price in purchase_prices(items)]
         normalise_kof = 1 / sum(items_kfs)
         price = len(items_kfs) * normalise_kof
         price = price + price * generic.default_mark_up_case
@@ -556,70 +534,75 @@ class Case(models.Model):
 
     recommendation_price.short_description = "Рекомендованная минимальная цена"
 
-    def _get_rand_item(self, user: User):
-        items = self.items.all()
-        # if items.filter(purchase_price=0).exists():
-        #    items = items.exclude(purchase_price=0)
-        # считаем коэффициент для айтемов и берём цену для дальнейших вычислений
-        items_kfs = {
-            item.item_id: {"kof": 1 / item.purchase_price, "price": item.purchase_price}
-            for item in items
-        }
-        # из полученных коэффициентов выше считаем нормализацию
-        normalise_kof = 1 / sum([items_kfs[item]["kof"] for item in items_kfs])
-        # высчитываем дефолтный процент для каждого айтема
-
-        for item in items_kfs.keys():
-            items_kfs[item]["percent"] = normalise_kof * items_kfs[item]["kof"]
-
-        if user.profile.individual_percent != 0:
-            # теперь считаем то же самое, что выше, только с учётом коэффициента пользователя
-            user_kof = normalise_kof * (1 + user.profile.individual_percent)
-            for item in items_kfs.keys():
-                if items_kfs[item]["price"] > self.price:
-                    items_kfs[item]["percent"] = user_kof * items_kfs[item]["kof"]
-            sum_percent = sum([items_kfs[item]["percent"] for item in items_kfs.keys()])
-            # Нормализиуем получившиеся проценты
-            for item in items_kfs.keys():
-                items_kfs[item]["percent"] = items_kfs[item]["percent"] / sum_percent
-
-        rand_item = choices(
-            list(items_kfs.keys()),
-            weights=[items_kfs[item]["percent"] for item in items_kfs.keys()],
-        )[0]
-        rand_item = self.items.get(item_id=rand_item)
-
-        return rand_item
+    def _get_rand_item(self, user: User) -> tuple[Item, float]:
+        """Возвращает выпавший предмет и его закупочную цену из таблицы выпадения"""
+        table = get_drop_table(self)
+        index = table.sample(user.profile.individual_percent)
+        return table.items[index], table.prices[index]
 
     def open_case(self, user: User):
         """Метод открытия кейса
         Условия проверки бесплатного кейса, только как защита от дурака
         """
+        opened = self.open_cases(user, 1)
+        return opened[0] if opened else (None, None)
+
+    def open_cases(self, user: User, count: int = 1) -> list[tuple[Item, "UserItems"]]:
+        """Открытие кейса count раз за один проход.
+        Все предметы выбираются из таблицы выпадения, записи пишутся через
+        bulk_create в одной транзакции, списание -- одна запись Calc на пачку.
+        Пустой список, если баланса не хватает
+        """
         from payments.models import Calc
-        from users.models import UserItems
-
-        item = self._get_rand_item(user)
-        win = item.purchase_price > self.price if not self.case_free else True
-        OpenedCases.objects.create(case=self, user=user, win=win, item=item)
-
-        if not self.case_free:
-            Calc.objects.create(
-                user=user,
-                balance=-self.price,
-                comment=f"Открытие кейса {self.name}",
-                demo=user.profile.demo,
+        from users.models import UserItems, UserProfile
+
+        drops = [self._get_rand_item(user) for _ in range(count)]
+        demo = user.profile.demo
+
+        comment = f"Открытие кейса {self.name}"
+        if count > 1:
+            comment = f"{comment} в количестве {count}"
+
+        with transaction.atomic():
+            profile = UserProfile.lock(user)
+            if not self.case_free and self.price * count > profile.balance:
+                return []
+
+            OpenedCases.objects.bulk_create(
+                [
+                    OpenedCases(
+                        case=self,
+                        user=user,
+                        item=item,
+                        win=purchase_price > self.price if not self.case_free else True,
+                        case_price=0 if self.case_free else self.price,
+                        item_cost=purchase_price,
+                        demo=demo,
+                    )
+                    for item, purchase_price in drops
+                ]
             )
-        else:
-            Calc.objects.create(
-                user=user,
-                comment=f"Открытие кейса {self.name}",
-                demo=user.profile.demo,
+
+            if not self.case_free:
+                Calc.objects.create(
+                    user=user,
+                    balance=-self.price * count,
+                    comment=comment,
+                    demo=demo,
+                )
+            else:
+                Calc.objects.create(user=user, comment=comment, demo=demo)
+
+            user_items = UserItems.objects.bulk_create(
+                [
+                    UserItems(user=user, item=item, from_case=True, case=self)
+                    for item, _ in drops
+                ]
             )
-        user_item = UserItems.objects.create(
-            user=user, item=item, from_case=True, case=self
-        )
+            counters.incr(counters.OPENED_CASES, len(drops))
+            rollups.mark_dirty(timezone.now())
 
-        return item, user_item
+        return [(item, user_item) for (item, _), user_item in zip(drops, user_items)]
 
     def __str__(self):
         return self.name
@@ -662,6 +645,13 @@ class OpenedCases(models.Model):
     )
 
     win = models.BooleanField(verbose_name="Предмет дороже кейса", default=False)
+    case_price = models.FloatField(
+        verbose_name="Уплачено за кейс", null=True, blank=True
+    )
+    item_cost = models.FloatField(
+        verbose_name="Закупочная цена предмета при открытии", null=True, blank=True
+    )
+    demo = models.BooleanField(verbose_name="Демо открытие", default=False)
 
     def __str__(self):
         return f"{self.user} открыл {self.case}"
@@ -0,0 +1,126 @@
+"""Расчёт закупочных цен предметов.
+
+Цены составных предметов держатся в памяти процесса снимком, разложенным по
+количеству кристаллов. Снимок пересобирается при смене версии в общем кэше,
+версию меняет сохранение CompositeItems. Курс доллара берётся через
+get_usd_rub_rate, поэтому расчёт цены не делает ни запросов в базу,
+ни HTTP-запросов.
+
+После пересчёта закупочных цен задача get_purchase_price_items отправляет
+сигнал prices_changed с id изменившихся предметов, на него подписаны кэши
+таблиц выпадения и страниц кейсов.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.dispatch import Signal
+
+from gateways.economia_api import get_usd_rub_rate
+from utils.functions import get_combination_solver, id_generator
+
+SNAPSHOT_VERSION_KEY = "pricing_snapshot_version"
+# как часто сверять версию снимка с общим кэшем, в секундах
+SNAPSHOT_CHECK_INTERVAL = 5
+
+# цена кристаллов поштучно, если их меньше минимального набора
+SINGLE_CRYSTAL_PRICE = 0.014
+SINGLE_CRYSTAL_LIMIT = 60
+# минимальная цена предмета в долларах, чтобы не делить на ноль
+MIN_PRICE_DOLLAR = 0.1
+
+_snapshot = None
+_checked_at = 0.0
+
+# отправляется с item_ids -- списком id предметов с новой закупочной ценой
+prices_changed = Signal()
+
+
+class PricingSnapshot:
+    """Снимок цен составных предметов"""
+
+    def __init__(self, composites: list, version=None):
+        self.version = version
+        self.crystals = {}
+        self.blessing = None
+        for composite in composites:
+            if composite.type == composite.BLESSING and self.blessing is None:
+                self.blessing = composite
+            if composite.type == composite.CRYSTAL and composite.crystals_quantity:
+                self.crystals.setdefault(composite.crystals_quantity, composite)
+        self.values = sorted(self.crystals)
+        self.solver = get_combination_solver(
+            {value: self.crystals[value].price_dollar for value in self.values}
+        )
+
+    def combination(self, crystals_quantity: int) -> list[int]:
+        """Самый дешёвый набор номиналов на указанное количество кристаллов"""
+        return self.solver.solve(crystals_quantity or 0)
+
+    def crystal_composites(self, crystals_quantity: int) -> list:
+        """Составные предметы, которыми выводится указанное количество кристаллов"""
+        return [self.crystals[com] for com in self.combination(crystals_quantity)]
+
+    def price_dollar(self, item_type: str, crystals_quantity: int) -> float:
+        from cases.models import Item
+
+        price = 0.0
+
+        if item_type == Item.BLESSING and self.blessing:
+            price += self.blessing.price_dollar
+
+        if item_type == Item.CRYSTAL and crystals_quantity < SINGLE_CRYSTAL_LIMIT:
+            price += crystals_quantity * SINGLE_CRYSTAL_PRICE
+        elif item_type in (Item.CRYSTAL, Item.GHOST_ITEM):
+            for composite in self.crystal_composites(crystals_quantity):
+                price += composite.price_dollar
+
+        if price == 0.0:
+            price += MIN_PRICE_DOLLAR
+        return price
+
+    def purchase_price(
+        self, item_type: str, crystals_quantity: int, rate: float = None
+    ) -> float:
+        price = self.price_dollar(item_type, crystals_quantity or 0)
+        if rate is None:
+            rate = get_usd_rub_rate()
+        return round(price * rate, 2)
+
+
+def invalidate_pricing():
+    global _checked_at
+
+    cache.set(SNAPSHOT_VERSION_KEY, id_generator(), None)
+    _checked_at = 0.0
+
+
+def get_pricing() -> PricingSnapshot:
+    global _snapshot, _checked_at
+
+    from payments.models import CompositeItems
+
+    now = time.monotonic()
+    if _snapshot is not None and now - _checked_at < SNAPSHOT_CHECK_INTERVAL:
+        return _snapshot
+
+    version = cache.get(SNAPSHOT_VERSION_KEY)
+    if _snapshot is None or _snapshot.version != version:
+        composites = CompositeItems.objects.all()
+        _snapshot = PricingSnapshot(list(composites), version)
+    _checked_at = now
+    return _snapshot
+
+
+def purchase_price(item) -> float:
+    return get_pricing().purchase_price(item.type, item.crystals_quantity)
+
+
+def purchase_prices(items) -> list[float]:
+    """Закупочные цены списка предметов одним проходом по снимку и одному курсу"""
+    pricing = get_pricing()
+    rate = get_usd_rub_rate()
+    return [
+        pricing.purchase_price(item.type, item.crystals_quantity, rate)
+        for item in items
+    ]
@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework import status
@@ -175,12 +176,18 @@ class UserItemSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
-        user_item = super().create(validated_data)
-        Calc.objects.create(
-            user_id=user_item.user_id,
-            balance=-user_item.item.price,
-            demo=self.context["request"].user.profile.demo,
-        )
+        with transaction.atomic():
+            profile = UserProfile.lock(validated_data["user"])
+            if validated_data["item"].price > profile.balance:
+                raise serializers.ValidationError(
+                    detail="Недостаточно средств", code=status.HTTP_406_NOT_ACCEPTABLE
+                )
+            user_item = super().create(validated_data)
+            Calc.objects.create(
+                user_id=user_item.user_id,
+                balance=-user_item.item.price,
+                demo=self.context["request"].user.profile.demo,
+            )
         return user_item
 
     class Meta:
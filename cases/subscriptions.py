@@ -0,0 +1,85 @@
+"""Проверка подписок на группы VK и каналы Telegram для условий кейсов.
+
+Результат проверки лежит в общем кэше по провайдеру, группе и аккаунту:
+подписка хранится MEMBER_TTL секунд, её отсутствие -- NOT_MEMBER_TTL. Когда
+положительному результату остаётся меньше REFRESH_BEFORE секунд, ставится
+фоновая перепроверка, и подписанный пользователь не ждёт внешний API.
+С force=True кэш не читается -- так пользователь, который только что
+подписался, может перепроверить подписку сразу.
+"""
+
+import time
+
+from django.core.cache import cache
+
+VK = "vk"
+TELEGRAM = "tg"
+
+MEMBER_TTL = 10 * 60
+NOT_MEMBER_TTL = 60
+REFRESH_BEFORE = 2 * 60
+# как часто пользователь может перепроверять подписки без кэша
+RECHECK_INTERVAL = 10
+
+SUBSCRIPTION_KEY = "subscription:{provider}:{group}:{account}"
+REFRESH_SCHEDULED_KEY = "subscription_refresh:{provider}:{group}:{account}"
+RECHECK_KEY = "subscription_recheck:{user_id}"
+
+
+def _key(template: str, provider: str, group, account) -> str:
+    return template.format(provider=provider, group=group, account=account)
+
+
+def fetch(provider: str, group, account) -> bool:
+    """Запрос во внешний API без кэша"""
+    from core.models import GenericSettings
+    from django.conf import settings
+    from gateways.telegram_bot_func import is_member_chanel
+    from gateways.vk_api import is_group_member
+
+    if provider == VK:
+        return is_group_member(group, account, settings.VK_APP_ACCESS_TOKEN)
+    return is_member_chanel(
+        chat_id=group,
+        user_id=account,
+        token=GenericSettings.load().telegram_verify_bot_token,
+    )
+
+
+def refresh(provider: str, group, account) -> bool:
+    member = fetch(provider, group, account)
+    cache.set(
+        _key(SUBSCRIPTION_KEY, provider, group, account),
+        {"member": member, "checked_at": time.time()},
+        MEMBER_TTL if member else NOT_MEMBER_TTL,
+    )
+    return member
+
+
+def is_member(provider: str, group, account, force: bool = False) -> bool:
+    if not force:
+        entry = cache.get(_key(SUBSCRIPTION_KEY, provider, group, account))
+        if entry is not None:
+            if entry["member"] and (
+                time.time() - entry["checked_at"] > MEMBER_TTL - REFRESH_BEFORE
+            ):
+                _schedule_refresh(provider, group, account)
+            return entry["member"]
+    try:
+        return refresh(provider, group, account)
+    except Exception:
+        # ошибку внешнего API не кэшируем, проверим при следующем открытии
+        return False
+
+
+def _schedule_refresh(provider: str, group, account):
+    from cases.tasks import refresh_subscription
+
+    key = _key(REFRESH_SCHEDULED_KEY, provider, group, account)
+    if cache.add(key, True, REFRESH_BEFORE):
+        refresh_subscription.delay(provider, group, account)
+
+
+def allow_recheck(user_id: int) -> bool:
+    """Не чаще раза в RECHECK_INTERVAL секунд на пользователя"""
+    return cache.add(RECHECK_KEY.format(user_id=user_id), True, RECHECK_INTERVAL)
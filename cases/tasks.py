@@ -1,26 +1,60 @@
-import redis
-import time
-import json
-
+from django.db import transaction
 from django.utils import timezone
-from django.conf import settings
 from celery import shared_task
+from cases import live_tape, pricing
 from cases.models import Contests, Item
 from users.models import ContestsWinners, UserItems
 
 from utils.decorators import single_task
+from utils.redis_client import get_redis
 
 
 @shared_task
-@single_task(None)
+@single_task(10 * 60)
 def get_purchase_price_items():
     """Таска для получения закупочной цены предмета.
     Рассчитана на пересчёт раз в 5-10 минут
     """
-    items = Item.objects.filter(removed=False)
-    for item in items:
-        item.purchase_price_cached = item.purchase_price
-        item.save()
+    items = list(
+        Item.objects.filter(removed=False).only(
+            "id", "type", "crystals_quantity", "purchase_price_cached"
+        )
+    )
+    changed = []
+    for item, price in zip(items, pricing.purchase_prices(items)):
+        if item.purchase_price_cached != price:
+            item.purchase_price_cached = price
+            changed.append(item)
+
+    if not changed:
+        return "Закупочные цены не изменились"
+    Item.objects.bulk_update(changed, ["purchase_price_cached"], batch_size=500)
+    # bulk_update не отправляет post_save, кэши сбрасываются по сигналу
+    transaction.on_commit(
+        lambda: pricing.prices_changed.send(
+            sender=Item, item_ids=[item.id for item in changed]
+        )
+    )
+    return f"Обновлены закупочные цены {len(changed)} предметов"
+
+
+@shared_task
+@single_task(10 * 60)
+def rebuild_case_details_task():
+    """Пересборка кэша страниц кейсов после изменений"""
+    from cases.case_cache import rebuild_case_details
+
+    count = rebuild_case_details()
+    return f"Пересобран кэш {count} кейсов"
+
+
+@shared_task
+def refresh_subscription(provider: str, group, account):
+    """Фоновая перепроверка подписки до истечения кэша"""
+    from cases import subscriptions
+
+    member = subscriptions.refresh(provider, group, account)
+    return f"Подписка {provider} {group} {account}: {member}"
 
 
 @shared_task
@@ -52,19 +86,9 @@ def get_winner_contest():
 
 @shared_task
 def clear_live_tape():
-    list_key = "live_tape"
-    expire_time = 24 * 60 * 60
-    current_time = time.time()
-
-    r = redis.from_url(settings.REDIS_CONNECTION_STRING)
-
-    items = r.lrange(list_key, 0, -1)
-
-    if not items:
-        return "Нет items в лайв ленте"
-
-    for i in items:
-        i_dict = json.loads(i.decode("utf-8"))
-        element_timestamp = float(i_dict["timestamp"])
-        if current_time - element_timestamp > expire_time:
-            r.lrem(list_key, 0, i)
+    """Чистка лайв ленты от предметов старше суток"""
+    r = get_redis()
+    # лента до перехода на sorted set больше не читается
+    r.delete(live_tape.LEGACY_LIST_KEY)
+    live_tape.trim(r)
+    return f"В лайв ленте {r.zcard(live_tape.LIVE_TAPE_KEY)} предметов"
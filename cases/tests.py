@@ -1,3 +1,203 @@
+import random
+from collections import Counter
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from cases import drop_table
+from cases.models import Case, Item
+from cases.pricing import get_pricing
+from core.models import GenericSettings
+from payments.models import CompositeItems
+from utils.functions import (
+    CombinationSolver,
+    find_combination,
+    get_combination_solver,
+)
+
+
+def reference_cost(costs: dict[int, float], target: int) -> tuple[int, float]:
+    """Ближайшая собираемая сумма не больше target и минимальная цена набора"""
+    best = [0.0] + [None] * target
+    for i in range(1, target + 1):
+        options = [
+            best[i - value] + cost
+            for value, cost in costs.items()
+            if value <= i and best[i - value] is not None
+        ]
+        best[i] = min(options, default=None)
+    closest = max(i for i in range(target + 1) if best[i] is not None)
+    return closest, best[closest]
+
+
+class CombinationSolverTest(TestCase):
+    def test_min_cost_matches_reference(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            values = rng.sample(range(2, 40), 4)
+            costs = {value: round(rng.uniform(0.5, 5), 2) for value in values}
+            solver = CombinationSolver(costs)
+            for target in range(0, 300, 7):
+                combination = solver.solve(target)
+                closest, cost = reference_cost(costs, target)
+
+                self.assertEqual(sum(combination), closest)
+                self.assertAlmostEqual(solver.cost(target), cost)
+                # находит ту же сумму, что и find_combination, но не дороже
+                old = find_combination(target, values)
+                self.assertEqual(sum(old), closest)
+                self.assertLessEqual(
+                    solver.cost(target), sum(costs[value] for value in old) + 1e-9
+                )
+
+    def test_prefers_cheaper_combination(self):
+        solver = CombinationSolver({1: 1.0, 5: 10.0, 6: 1.0})
+
+        self.assertEqual(sorted(solver.solve(10)), [1, 1, 1, 1, 6])
+        self.assertEqual(solver.cost(10), 5.0)
+
+    def test_falls_back_to_closest_smaller_sum(self):
+        solver = CombinationSolver({4: 1.0, 6: 1.0})
+
+        self.assertEqual(sum(solver.solve(9)), 8)
+        self.assertEqual(solver.solve(3), [])
+
+    def test_empty_for_zero_and_negative_targets(self):
+        solver = CombinationSolver({1: 1.0})
+
+        self.assertEqual(solver.solve(0), [])
+        self.assertEqual(solver.solve(-5), [])
+        self.assertEqual(CombinationSolver({}).solve(10), [])
+
+    def test_targets_above_max_target_do_not_grow_table(self):
+        costs = {3: 1.0, 7: 2.0}
+        solver = CombinationSolver(costs, max_target=50)
+
+        combination = solver.solve(121)
+
+        self.assertEqual(sum(combination), 121)
+        self.assertAlmostEqual(solver.cost(121), reference_cost(costs, 121)[1])
+        self.assertEqual(len(solver.best), 1)
+
+    def test_solver_is_shared_per_cost_set(self):
+        costs = {3: 1.0, 7: 2.0}
+
+        self.assertIs(get_combination_solver(costs), get_combination_solver(costs))
+        self.assertIsNot(
+            get_combination_solver(costs), get_combination_solver({3: 1.0, 7: 1.0})
+        )
+
+    def test_composite_price_change_rebuilds_solver(self):
+        small = CompositeItems.objects.create(
+            type=CompositeItems.CRYSTAL, crystals_quantity=60, price_dollar=1
+        )
+        CompositeItems.objects.create(
+            type=CompositeItems.CRYSTAL, crystals_quantity=300, price_dollar=4
+        )
+        solver = get_pricing().solver
+        self.assertEqual(get_pricing().combination(300), [300])
+
+        small.price_dollar = 0.5
+        small.save()
+
+        self.assertIsNot(get_pricing().solver, solver)
+        self.assertEqual(get_pricing().combination(300), [60] * 5)
+
+
+def reference_percents(
+    case_price: float, prices: list[float], individual_percent: float
+) -> list[float]:
+    """Вероятности выпадения по прежнему _get_rand_item: вес 1 / цена,
+    у предметов дороже кейса он умножен на 1 + individual_percent
+    """
+    weights = [
+        (1 + individual_percent) / price if price > case_price else 1 / price
+        for price in prices
+    ]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+class DropTableTest(TestCase):
+    SAMPLES = 200_000
+
+    def setUp(self):
+        drop_table._tables.clear()
+        # пересчёт рекомендованной цены кейса не должен ходить за курсом
+        patcher = mock.patch("cases.pricing.get_usd_rub_rate", return_value=90.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        state = random.getstate()
+        random.seed(1)
+        self.addCleanup(random.setstate, state)
+
+    def assertDistribution(self, indexes, expected: list[float]):
+        counts = Counter(indexes)
+        for index, percent in enumerate(expected):
+            self.assertAlmostEqual(counts[index] / self.SAMPLES, percent, delta=0.005)
+
+    def test_alias_sampler_follows_weights(self):
+        sampler = drop_table.AliasSampler([1, 2, 7, 0.5])
+
+        self.assertDistribution(
+            (sampler.sample() for _ in range(self.SAMPLES)),
+            [1 / 10.5, 2 / 10.5, 7 / 10.5, 0.5 / 10.5],
+        )
+
+    def test_sampling_matches_baseline_weights(self):
+        prices = [10, 20, 50, 150, 400]
+        table = drop_table.DropTable(100, list("abcde"), prices, None)
+
+        for individual_percent in (0, 0.5, -0.5, -1):
+            with self.subTest(individual_percent=individual_percent):
+                self.assertDistribution(
+                    (table.sample(individual_percent) for _ in range(self.SAMPLES)),
+                    reference_percents(100, prices, individual_percent),
+                )
+
+    def create_case(self) -> Case:
+        items = [
+            Item.objects.create(name=f"item {i}", price=i, purchase_price_cached=i * 10)
+            for i in range(1, 4)
+        ]
+        case = Case.objects.create(name="case", price=15)
+        case.items.set(items)
+        return Case.objects.get(pk=case.pk)
+
+    def assertRebuilt(self, case: Case, change):
+        table = drop_table.get_drop_table(case)
+        self.assertIs(drop_table.get_drop_table(case), table)
+        change()
+        self.assertIsNot(drop_table.get_drop_table(case), table)
+
+    def test_table_rebuilds_after_changes(self):
+        case = self.create_case()
+        item = case.items.first()
+        other = Item.objects.create(name="other", price=5, purchase_price_cached=50)
+
+        self.assertRebuilt(case, item.save)
+        self.assertRebuilt(case, Case.objects.get(pk=case.pk).save)
+        self.assertRebuilt(case, GenericSettings.load().save)
+        self.assertRebuilt(case, lambda: case.items.add(other))
+        self.assertRebuilt(case, lambda: other.case_set.remove(case))
+
+    def test_table_rebuilds_after_version_change_in_another_process(self):
+        case = self.create_case()
+
+        # другой процесс меняет только версии в общем кэше
+        self.assertRebuilt(
+            case, lambda: cache.set(drop_table.GLOBAL_VERSION_KEY, "other")
+        )
+        self.assertRebuilt(
+            case,
+            lambda: cache.set(
+                drop_table.CASE_VERSION_KEY.format(case_id=case.case_id), "other"
+            ),
+        )
+
+        table = drop_table.get_drop_table(case)
+        case.price = 25
+        self.assertIsNot(drop_table.get_drop_table(case), table)
+        table = drop_table.get_drop_table(case)
+        self.assertEqual([table.prices[i] for i in table.win_ids], [30])
@@ -30,9 +30,13 @@ from cases.models import Case, Item, RarityCategory, ConditionCase, Contests, Ca
 from utils.default_filters import CustomOrderFilter
 from utils.serializers import SuccessSerializer, BulkDestroySerializer
 from utils.functions.write_redis_items import write_items_in_redis
-from utils.functions.combinations import find_combination
-
-from payments.models import CompositeItems
+from cases import subscriptions
+from cases.pricing import get_pricing
+from cases.case_cache import (
+    get_case_detail,
+    build_case_detail,
+    invalidate_case_details,
+)
 
 
 @extend_schema(tags=["contests"])
@@ -81,7 +85,7 @@ class CasesViewSet(GenericViewSet):
         return CaseSerializer
 
     def get_permissions(self):
-        if self.action == "open_case":
+        if self.action in ("open_case", "recheck_conditions"):
             self.permission_classes = [IsAuthenticated]
         else:
             self.permission_classes = [AllowAny]
@@ -103,9 +107,12 @@ class CasesViewSet(GenericViewSet):
         return self.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data = get_case_detail(kwargs[self.lookup_field])
+        if data is None:
+            data = build_case_detail(self.get_object())
+        if data["image"]:
+            data["image"] = request.build_absolute_uri(data["image"])
+        return Response(data, status=status.HTTP_200_OK)
 
     @extend_schema(request=None, responses={200: ItemListSerializer})
     @action(
@@ -131,18 +138,13 @@ class CasesViewSet(GenericViewSet):
         if not success:
             return Response({"message": message}, status=status.HTTP_400_BAD_REQUEST)
 
-        if case.price * count > request.user.profile.balance:
+        # баланс проверяется под блокировкой профиля в open_cases
+        r_items = case.open_cases(request.user, count)
+        if not r_items:
             return Response(
                 {"message": "Недостаточно средств!"}, status=status.HTTP_400_BAD_REQUEST
             )
-
-        items = []
-        r_items = []
-
-        for _ in range(count):
-            item, user_item = case.open_case(request.user)
-            items.append(user_item)
-            r_items.append((item, user_item))
+        items = [user_item for _, user_item in r_items]
 
         serializer = self.get_serializer(items, many=True)
 
@@ -150,6 +152,23 @@ class CasesViewSet(GenericViewSet):
 
         return Response(serializer.data)
 
+    @extend_schema(
+        request=None, responses={200: SuccessSerializer, 400: SuccessSerializer}
+    )
+    @action(detail=True, methods=["post"])
+    def recheck_conditions(self, request, *args, **kwargs):
+        """Проверка условий кейса с запросом подписок во внешних API без кэша,
+        например сразу после подписки на группу
+        """
+        case = self.get_object()
+        recheck = subscriptions.allow_recheck(request.user.id)
+        message, success = case.check_conditions(request.user, recheck=recheck)
+        if not success:
+            return Response({"message": message}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"message": "Условия открытия кейса выполнены"}, status=status.HTTP_200_OK
+        )
+
 
 @extend_schema(tags=["admin/conditions"])
 class AdminConditionsViewSet(ModelViewSet):
@@ -318,6 +337,8 @@ class AdminCasesViewSet(ModelViewSet):
             .update(removed=True, active=False)
         )
         if count > 0:
+            # update не отправляет post_save, кэш страниц сбрасываем сами
+            invalidate_case_details()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -327,6 +348,8 @@ class AdminCasesViewSet(ModelViewSet):
         ids = request.data.get("ids")
         queryset = self.get_queryset().filter(case_id__in=ids)
         count = queryset.update(removed=True, active=False)
+        if count:
+            invalidate_case_details()
         return Response(
             {"message": f"Удалено {count} объектов"}, status=status.HTTP_202_ACCEPTED
         )
@@ -424,6 +447,7 @@ class ItemAdminViewSet(ModelViewSet):
             .update(removed=True, sale=False)
         )
         if count > 0:
+            invalidate_case_details()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -435,18 +459,15 @@ class ItemAdminViewSet(ModelViewSet):
         count = queryset.update(
             removed=True, sale=False, upgrade=False, is_output=False
         )
+        if count:
+            invalidate_case_details()
         return Response(
             {"message": f"Удалено {count} объектов"}, status=status.HTTP_202_ACCEPTED
         )
 
     def get_crystal_count_recommendation(self, request, *args, **kwargs):
         count = kwargs.get("crystal_castles")
-        composites = CompositeItems.objects.all()
-        crystal_composite = composites.filter(type=CompositeItems.CRYSTAL)
-        value_set = sorted(
-            [i.crystals_quantity for i in crystal_composite], key=lambda x: x
-        )
-        combinations = find_combination(count, value_set)
+        combinations = get_pricing().combination(count)
 
         sum_combinations = sum(combinations)
 
@@ -1,6 +1,64 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+def invalidate_core_cache(sender, **kwargs):
+    from utils.cache import get_app_cache
+
+    get_app_cache("core").invalidate()
+
+
+def count_new_user(sender, instance, created, **kwargs):
+    from core import counters
+
+    if created:
+        counters.incr(counters.TOTAL_USERS)
+
+
+def count_purchase(sender, instance, created, **kwargs):
+    from core import counters
+
+    if created and not instance.from_case:
+        counters.incr(counters.TOTAL_PURCHASE)
+
+
+def mark_rollup_dirty(sender, instance, **kwargs):
+    from core import rollups
+
+    rollups.mark_dirty(getattr(instance, "created_at", None))
+
+
+def mark_rollup_dirty_user(sender, instance, created, **kwargs):
+    from core import rollups
+
+    if created:
+        rollups.mark_dirty(instance.date_joined)
+
+
+def record_leaderboard_payment(sender, instance, **kwargs):
+    from core import leaderboards
+
+    paid = instance.status in (instance.SUCCESS, instance.APPROVAL)
+    if paid and not instance.active and leaderboards.enabled():
+        leaderboards.record_payment(instance)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from core.models import GenericSettings
+        from payments.models import Output, PaymentOrder
+        from users.models import UserItems
+
+        post_save.connect(invalidate_core_cache, sender=GenericSettings)
+        post_save.connect(count_new_user, sender=User)
+        post_save.connect(count_purchase, sender=UserItems)
+        post_save.connect(mark_rollup_dirty, sender=PaymentOrder)
+        post_save.connect(record_leaderboard_payment, sender=PaymentOrder)
+        post_save.connect(mark_rollup_dirty, sender=Output)
+        post_delete.connect(mark_rollup_dirty, sender=PaymentOrder)
+        post_delete.connect(mark_rollup_dirty, sender=Output)
+        post_save.connect(mark_rollup_dirty_user, sender=User)
@@ -0,0 +1,75 @@
+"""Счётчики подвала сайта.
+
+Открытые кейсы, пользователи, покупки в магазине и выведенные кристаллы
+хранятся в Redis и увеличиваются в местах записи после коммита транзакции.
+Подвал читает их одним MGET без запросов в базу. Задача
+reconcile_site_counters периодически пересчитывает значения по базе и
+исправляет расхождения.
+"""
+
+import redis
+from django.db import transaction
+
+from utils.redis_client import get_redis
+
+OPENED_CASES = "opened_cases"
+TOTAL_USERS = "total_users"
+TOTAL_PURCHASE = "total_purchase"
+TOTAL_CRYSTAL = "total_crystal"
+COUNTERS = (OPENED_CASES, TOTAL_USERS, TOTAL_PURCHASE, TOTAL_CRYSTAL)
+
+COUNTER_KEY = "site_counters:{name}"
+
+
+def _key(name: str) -> str:
+    return COUNTER_KEY.format(name=name)
+
+
+def incr(name: str, amount: int = 1):
+    """Увеличивает счётчик после коммита текущей транзакции"""
+    if not amount:
+        return
+
+    def send():
+        try:
+            get_redis().incrby(_key(name), amount)
+        except redis.RedisError:
+            # расхождение исправит reconcile_site_counters
+            pass
+
+    transaction.on_commit(send)
+
+
+def count_from_db() -> dict[str, int]:
+    from django.contrib.auth.models import User
+    from django.db.models import Sum
+
+    from cases.models import OpenedCases
+    from payments.models import PurchaseCompositeItems
+    from users.models import UserItems
+
+    total_crystal = PurchaseCompositeItems.objects.filter(
+        status=PurchaseCompositeItems.COMPLETED
+    ).aggregate(total=Sum("composite_item__crystals_quantity"))["total"]
+    return {
+        OPENED_CASES: OpenedCases.objects.count(),
+        TOTAL_USERS: User.objects.count(),
+        TOTAL_PURCHASE: UserItems.objects.filter(from_case=False).count(),
+        TOTAL_CRYSTAL: total_crystal or 0,
+    }
+
+
+def reconcile() -> dict[str, int]:
+    """Записывает в Redis значения, посчитанные по базе"""
+    values = count_from_db()
+    get_redis().mset({_key(name): value for name, value in values.items()})
+    return values
+
+
+def get_counters() -> dict[str, int]:
+    """Все счётчики за один запрос в Redis"""
+    values = get_redis().mget([_key(name) for name in COUNTERS])
+    if None in values:
+        # Redis очищен или счётчики ещё не заполнены
+        return reconcile()
+    return dict(zip(COUNTERS, map(int, values)))
@@ -0,0 +1,230 @@
+"""Топы пользователей для аналитики.
+
+По умолчанию топ считается одним запросом: сумма на пользователя -- через
+подзапрос или GROUP BY, сортировка и LIMIT в базе. С REDIS_LEADERBOARDS топы
+читаются из sorted set, которые пополняются при успешной оплате:
+пополнения за сутки лежат в часовых наборах DEPOSITS_KEY, доход рефералов --
+в REF_INCOME_KEY. Задача rebuild_leaderboards пересобирает наборы по базе.
+"""
+
+import datetime
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, TruncHour
+from django.utils import timezone
+
+from utils.redis_client import get_redis
+
+DEPOSITS_KEY = "leaderboard:deposits:{hour}"
+DEPOSITS_UNION_KEY = "leaderboard:deposits:day"
+REF_INCOME_KEY = "leaderboard:ref_income"
+RECORDED_KEY = "leaderboard:order:{order_id}"
+DEPOSITS_HOURS = 24
+# сколько секунд отдаётся собранный набор пополнений за сутки
+DEPOSITS_UNION_TTL = 60
+
+
+def enabled() -> bool:
+    return settings.REDIS_LEADERBOARDS
+
+
+def _hour_key(moment: datetime.datetime) -> str:
+    return DEPOSITS_KEY.format(
+        hour=moment.astimezone(datetime.timezone.utc).strftime("%Y%m%d%H")
+    )
+
+
+def _deposit_keys() -> list[str]:
+    now = timezone.now()
+    return [_hour_key(now - datetime.timedelta(hours=i)) for i in range(DEPOSITS_HOURS)]
+
+
+def _ref_income():
+    """Пополнения приглашённых по ссылкам профиля, как в UserProfile.total_income"""
+    from payments.models import Calc
+
+    return (
+        Calc.objects.filter(
+            ref_link__bonus_using=True,
+            ref_link__link__from_user=OuterRef("pk"),
+            ref_link__link__active=True,
+            ref_link__link__removed=False,
+        )
+        .order_by()
+        .values("ref_link__link__from_user")
+        .annotate(total=Sum("order__sum"))
+        .values("total")
+    )
+
+
+def _referrers(queryset):
+    from users.models import ActivatedLinks
+
+    count_next = (
+        ActivatedLinks.objects.filter(link__from_user=OuterRef("pk"))
+        .order_by()
+        .values("link__from_user")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return queryset.select_related("user").annotate(
+        count_next=Coalesce(Subquery(count_next), 0),
+        total_income=Coalesce(Cast(Subquery(_ref_income()), FloatField()), Value(0.0))
+        * F("partner_income"),
+    )
+
+
+def _referrer_record(profile, total_income: float) -> dict:
+    return {
+        "id": profile.id,
+        "name": profile.user.username,
+        "image": str(profile.image) or None,
+        "count_next": profile.count_next,
+        "total_income": round(total_income, 2),
+    }
+
+
+def top_referrers(limit: int) -> list[dict]:
+    from users.models import UserProfile
+
+    if enabled():
+        scores = dict(
+            (int(member), score)
+            for member, score in get_redis().zrevrange(
+                REF_INCOME_KEY, 0, limit - 1, withscores=True
+            )
+        )
+        profiles = _referrers(UserProfile.objects.filter(id__in=scores))
+        records = [_referrer_record(p, scores[p.id]) for p in profiles]
+        return sorted(records, key=lambda x: x["total_income"], reverse=True)
+
+    profiles = _referrers(UserProfile.objects.all()).order_by("-total_income")
+    return [_referrer_record(p, p.total_income) for p in profiles[:limit]]
+
+
+def _depositor_records(scores: dict) -> list[dict]:
+    from users.models import UserProfile
+
+    profiles = UserProfile.objects.filter(user_id__in=scores).select_related("user")
+    records = [
+        {
+            "id": profile.id,
+            "name": profile.user.username,
+            "image": str(profile.image) or None,
+            "payments_price": float(scores[profile.user_id]),
+        }
+        for profile in profiles
+    ]
+    return sorted(records, key=lambda x: x["payments_price"], reverse=True)
+
+
+def top_depositors(limit: int) -> list[dict]:
+    """Пользователи с наибольшей суммой успешных пополнений за сутки"""
+    from payments.models import PaymentOrder
+
+    if enabled():
+        client = get_redis()
+        if not client.exists(DEPOSITS_UNION_KEY):
+            pipe = client.pipeline()
+            pipe.zunionstore(DEPOSITS_UNION_KEY, _deposit_keys())
+            pipe.expire(DEPOSITS_UNION_KEY, DEPOSITS_UNION_TTL)
+            pipe.execute()
+        scores = client.zrevrange(DEPOSITS_UNION_KEY, 0, limit - 1, withscores=True)
+        return _depositor_records({int(member): score for member, score in scores})
+
+    since = timezone.now() - datetime.timedelta(hours=DEPOSITS_HOURS)
+    rows = (
+        PaymentOrder.objects.filter(
+            created_at__gte=since, status=PaymentOrder.SUCCESS, user__isnull=False
+        )
+        .values("user_id")
+        .annotate(total=Sum("sum"))
+        .order_by("-total")[:limit]
+    )
+    return _depositor_records({row["user_id"]: row["total"] for row in rows})
+
+
+def record_payment(order):
+    """Учитывает успешную оплату в топах один раз, после коммита"""
+    from users.models import UserProfile
+
+    referrer = (
+        UserProfile.objects.filter(
+            ref_links__activated_links__calc_link__order=order,
+            ref_links__activated_links__bonus_using=True,
+            ref_links__active=True,
+            ref_links__removed=False,
+        )
+        .values("id", "partner_income")
+        .first()
+    )
+
+    def send():
+        client = get_redis()
+        try:
+            if not client.set(
+                RECORDED_KEY.format(order_id=order.id),
+                1,
+                nx=True,
+                ex=DEPOSITS_HOURS * 60 * 60 * 2,
+            ):
+                return
+            pipe = client.pipeline()
+            if order.status == order.SUCCESS:
+                key = _hour_key(order.created_at)
+                pipe.zincrby(key, float(order.sum), order.user_id)
+                pipe.expire(key, (DEPOSITS_HOURS + 1) * 60 * 60)
+            if referrer:
+                pipe.zincrby(
+                    REF_INCOME_KEY,
+                    float(order.sum) * referrer["partner_income"],
+                    referrer["id"],
+                )
+            pipe.execute()
+        except redis.RedisError:
+            # расхождение исправит rebuild_leaderboards
+            pass
+
+    transaction.on_commit(send)
+
+
+def rebuild():
+    """Пересобирает наборы топов по базе"""
+    from payments.models import PaymentOrder
+    from users.models import UserProfile
+
+    since = timezone.now() - datetime.timedelta(hours=DEPOSITS_HOURS)
+    deposits = (
+        PaymentOrder.objects.filter(
+            created_at__gte=since, status=PaymentOrder.SUCCESS, user__isnull=False
+        )
+        .annotate(hour=TruncHour("created_at", tzinfo=datetime.timezone.utc))
+        .values("hour", "user_id")
+        .annotate(total=Sum("sum"))
+        .order_by()
+    )
+    buckets = {}
+    for row in deposits:
+        buckets.setdefault(_hour_key(row["hour"]), {})[row["user_id"]] = float(
+            row["total"]
+        )
+
+    income = (
+        _referrers(UserProfile.objects.all())
+        .filter(total_income__gt=0)
+        .values_list("id", "total_income")
+    )
+
+    pipe = get_redis().pipeline()
+    pipe.delete(DEPOSITS_UNION_KEY, REF_INCOME_KEY, *_deposit_keys())
+    for key, scores in buckets.items():
+        pipe.zadd(key, scores)
+        pipe.expire(key, (DEPOSITS_HOURS + 1) * 60 * 60)
+    ref_scores = dict(income)
+    if ref_scores:
+        pipe.zadd(REF_INCOME_KEY, ref_scores)
+    pipe.execute()
+    return len(ref_scores)
@@ -0,0 +1,41 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+
+from core import rollups, timeseries
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает итоги аналитики по дням, по умолчанию с первой "
+        "регистрации по вчерашний день. Каждый день -- отдельная транзакция"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from_date", help="YYYY-MM-DD")
+        parser.add_argument("--to", dest="to_date", help="YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        if options["from_date"]:
+            day = datetime.date.fromisoformat(options["from_date"])
+        else:
+            first = User.objects.order_by("date_joined").first()
+            if first is None:
+                self.stdout.write("Нет данных для пересчёта")
+                return
+            day = first.date_joined.astimezone(timeseries.ANALYTICS_TZ).date()
+
+        if options["to_date"]:
+            end = datetime.date.fromisoformat(options["to_date"])
+        else:
+            end = timeseries.local_today() - datetime.timedelta(days=1)
+
+        count = 0
+        while day <= end:
+            rollups.rebuild_day(day)
+            count += 1
+            if count % 30 == 0:
+                self.stdout.write(f"Пересчитано по {day}")
+            day += datetime.timedelta(days=1)
+        self.stdout.write(f"Пересчитано дней: {count}")
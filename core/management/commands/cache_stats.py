@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from utils.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Попадания и промахи кэша по пространствам имён"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        for namespace, values in sorted(stats.items()):
+            self.stdout.write(
+                f"{namespace}: попаданий {values['hit']}, "
+                f"в памяти процесса {values['l1_hit']}, промахов {values['miss']}, "
+                f"доля попаданий {values['hit_rate']:.2%}"
+            )
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write("Счётчики сброшены")
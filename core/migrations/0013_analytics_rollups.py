@@ -0,0 +1,118 @@
+# Generated by Django 4.2.9 on 2026-10-18 10:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0039_opened_cases_economics"),
+        ("core", "0012_genericsettings_generic_url"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalyticsRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("hour", "Час"), ("day", "День")],
+                        max_length=8,
+                        verbose_name="Отрезок",
+                    ),
+                ),
+                ("bucket", models.DateTimeField(verbose_name="Начало отрезка")),
+                (
+                    "deposits_sum",
+                    models.FloatField(default=0, verbose_name="Сумма пополнений"),
+                ),
+                (
+                    "deposits_count",
+                    models.IntegerField(default=0, verbose_name="Пополнений"),
+                ),
+                (
+                    "withdrawals_sum",
+                    models.FloatField(default=0, verbose_name="Сумма выводов"),
+                ),
+                (
+                    "outlay_sum",
+                    models.FloatField(default=0, verbose_name="Стоимость закупок"),
+                ),
+                (
+                    "withdrawals_count",
+                    models.IntegerField(default=0, verbose_name="Выводов"),
+                ),
+                (
+                    "openings",
+                    models.IntegerField(default=0, verbose_name="Открытий кейсов"),
+                ),
+                (
+                    "registrations",
+                    models.IntegerField(default=0, verbose_name="Регистраций"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Пересчитано"),
+                ),
+            ],
+            options={
+                "verbose_name": "Итоги аналитики",
+                "verbose_name_plural": "Итоги аналитики",
+                "ordering": ("-bucket",),
+                "unique_together": {("granularity", "bucket")},
+            },
+        ),
+        migrations.CreateModel(
+            name="CaseRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="День")),
+                ("openings", models.IntegerField(default=0, verbose_name="Открытий")),
+                (
+                    "paid",
+                    models.FloatField(default=0, verbose_name="Уплачено за кейсы"),
+                ),
+                (
+                    "cost",
+                    models.FloatField(
+                        default=0, verbose_name="Стоимость выпавших предметов"
+                    ),
+                ),
+                (
+                    "case",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="cases.case",
+                        to_field="case_id",
+                        verbose_name="Кейс",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Итоги кейса за день",
+                "verbose_name_plural": "Итоги кейсов за день",
+                "ordering": ("-date",),
+                "unique_together": {("date", "case")},
+            },
+        ),
+    ]
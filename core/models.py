@@ -104,3 +104,59 @@ class GenericSettings(models.Model):
     class Meta:
         verbose_name = "Основная настройка"
         verbose_name_plural = "Основные настройки"
+
+
+class AnalyticsRollup(models.Model):
+    """Итоги аналитики за час или день по московскому времени.
+    Пересчитываются задачей update_analytics_rollups, см. core.rollups
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+
+    GRANULARITIES = (
+        (HOUR, "Час"),
+        (DAY, "День"),
+    )
+
+    granularity = models.CharField(
+        verbose_name="Отрезок", max_length=8, choices=GRANULARITIES
+    )
+    bucket = models.DateTimeField(verbose_name="Начало отрезка")
+
+    deposits_sum = models.FloatField(verbose_name="Сумма пополнений", default=0)
+    deposits_count = models.IntegerField(verbose_name="Пополнений", default=0)
+    withdrawals_sum = models.FloatField(verbose_name="Сумма выводов", default=0)
+    outlay_sum = models.FloatField(verbose_name="Стоимость закупок", default=0)
+    withdrawals_count = models.IntegerField(verbose_name="Выводов", default=0)
+    openings = models.IntegerField(verbose_name="Открытий кейсов", default=0)
+    registrations = models.IntegerField(verbose_name="Регистраций", default=0)
+    updated_at = models.DateTimeField(verbose_name="Пересчитано", auto_now=True)
+
+    class Meta:
+        ordering = ("-bucket",)
+        unique_together = ("granularity", "bucket")
+        verbose_name = "Итоги аналитики"
+        verbose_name_plural = "Итоги аналитики"
+
+
+class CaseRollup(models.Model):
+    """Открытия и выручка кейса за день без демо открытий"""
+
+    date = models.DateField(verbose_name="День")
+    case = models.ForeignKey(
+        verbose_name="Кейс",
+        to="cases.Case",
+        to_field="case_id",
+        on_delete=models.CASCADE,
+        related_name="rollups",
+    )
+    openings = models.IntegerField(verbose_name="Открытий", default=0)
+    paid = models.FloatField(verbose_name="Уплачено за кейсы", default=0)
+    cost = models.FloatField(verbose_name="Стоимость выпавших предметов", default=0)
+
+    class Meta:
+        ordering = ("-date",)
+        unique_together = ("date", "case")
+        verbose_name = "Итоги кейса за день"
+        verbose_name_plural = "Итоги кейсов за день"
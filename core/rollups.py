@@ -0,0 +1,300 @@
+"""Итоги аналитики по часам и дням.
+
+Пополнения, выводы, открытия и регистрации хранятся в AnalyticsRollup за
+каждый час и день по московскому времени, выручка по кейсам -- в CaseRollup.
+Изменение пополнения, вывода, пользователя или открытие кейса помечает день
+своей записи в множестве DIRTY_DAYS_KEY, задача update_analytics_rollups
+пересчитывает только помеченные дни.
+
+Закрытый день -- прошедший день с записью итогов, которого нет в
+DIRTY_DAYS_KEY. Отчёты берут закрытые дни из итогов, а открытые -- текущий,
+помеченные и ещё не посчитанные backfill -- считают по исходным таблицам,
+соседние открытые дни одним запросом на таблицу. Поэтому до backfill отчёты
+верны, только медленнее.
+"""
+
+import datetime
+
+import redis
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+
+from core import timeseries
+from core.models import AnalyticsRollup, CaseRollup
+from utils.redis_client import get_redis
+
+DIRTY_DAYS_KEY = "analytics_rollup:dirty"
+METRICS = (
+    "deposits_sum",
+    "deposits_count",
+    "withdrawals_sum",
+    "outlay_sum",
+    "withdrawals_count",
+    "openings",
+    "registrations",
+)
+COUNT_METRICS = ("deposits_count", "withdrawals_count", "openings", "registrations")
+
+
+def _number(name: str, value) -> int | float:
+    if name in COUNT_METRICS:
+        return int(value or 0)
+    return float(value or 0)
+
+
+def mark_dirty(moment: datetime.datetime):
+    """Помечает день, к которому относится moment, после коммита транзакции"""
+    if moment is None:
+        return
+    day = moment.astimezone(timeseries.ANALYTICS_TZ).date().isoformat()
+
+    def send():
+        try:
+            get_redis().sadd(DIRTY_DAYS_KEY, day)
+        except redis.RedisError:
+            # день пересчитается при следующем изменении или backfill
+            pass
+
+    transaction.on_commit(send)
+
+
+def _sources() -> list[tuple]:
+    """Исходные таблицы: queryset, поле даты и агрегаты метрик"""
+    from cases.models import OpenedCases
+    from payments.models import Output, PaymentOrder
+
+    return [
+        (
+            PaymentOrder.objects.filter(
+                status__in=(PaymentOrder.SUCCESS, PaymentOrder.APPROVAL)
+            ),
+            "created_at",
+            dict(deposits_sum=Sum("sum"), deposits_count=Count("id")),
+        ),
+        (
+            Output.objects.filter(status=Output.COMPLETED),
+            "created_at",
+            dict(
+                withdrawals_sum=Sum("withdrawal_price"),
+                outlay_sum=Sum("cost_rub"),
+                withdrawals_count=Count("id"),
+            ),
+        ),
+        (OpenedCases.objects.all(), "open_date", dict(openings=Count("id"))),
+        (
+            User.objects.filter(is_staff=False, is_superuser=False),
+            "date_joined",
+            dict(registrations=Count("id")),
+        ),
+    ]
+
+
+def compute_period(start: datetime.datetime, end: datetime.datetime) -> dict:
+    """Суммы метрик за [start, end) по исходным таблицам"""
+    values = {}
+    for queryset, field, aggregates in _sources():
+        values.update(
+            queryset.filter(**{f"{field}__gte": start, f"{field}__lt": end}).aggregate(
+                **aggregates
+            )
+        )
+    return {name: _number(name, values[name]) for name in METRICS}
+
+
+def compute_day(day: datetime.date) -> tuple[list[AnalyticsRollup], AnalyticsRollup]:
+    """Итоги по часам и за день целиком, запрос на каждую исходную таблицу"""
+    start, end = timeseries.day_bounds(day)
+    hours = []
+    sources = [
+        timeseries.time_series(
+            queryset, field, start, end, timeseries.HOUR, **aggregates
+        )
+        for queryset, field, aggregates in _sources()
+    ]
+    for rows in zip(*sources):
+        values = {}
+        for row in rows:
+            values.update(row)
+        bucket = values.pop("date")
+        hours.append(
+            AnalyticsRollup(
+                granularity=AnalyticsRollup.HOUR,
+                bucket=bucket,
+                **{name: _number(name, values[name]) for name in METRICS},
+            )
+        )
+    total = AnalyticsRollup(
+        granularity=AnalyticsRollup.DAY,
+        bucket=start,
+        **{name: sum(getattr(hour, name) for hour in hours) for name in METRICS},
+    )
+    return hours, total
+
+
+def compute_case_day(day: datetime.date) -> list[CaseRollup]:
+    from cases.models import OpenedCases
+
+    start, end = timeseries.day_bounds(day)
+    rows = (
+        OpenedCases.objects.filter(
+            open_date__gte=start, open_date__lt=end, demo=False, case__isnull=False
+        )
+        .values("case_id")
+        .annotate(openings=Count("id"), paid=Sum("case_price"), cost=Sum("item_cost"))
+        .order_by()
+    )
+    return [
+        CaseRollup(
+            date=day,
+            case_id=row["case_id"],
+            openings=row["openings"],
+            paid=row["paid"] or 0,
+            cost=row["cost"] or 0,
+        )
+        for row in rows
+    ]
+
+
+def rebuild_day(day: datetime.date):
+    """Пересчитывает итоги дня и заменяет старые записи"""
+    hours, total = compute_day(day)
+    cases = compute_case_day(day)
+    start, end = timeseries.day_bounds(day)
+    with transaction.atomic():
+        AnalyticsRollup.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        AnalyticsRollup.objects.bulk_create([*hours, total])
+        CaseRollup.objects.filter(date=day).delete()
+        CaseRollup.objects.bulk_create(cases)
+
+
+def rebuild_dirty_days(limit: int = 100) -> list[str]:
+    client = get_redis()
+    days = client.srandmember(DIRTY_DAYS_KEY, limit)
+    rebuilt = []
+    for day in days:
+        if isinstance(day, bytes):
+            day = day.decode()
+        # снимаем отметку до пересчёта, новое изменение поставит её снова
+        client.srem(DIRTY_DAYS_KEY, day)
+        try:
+            rebuild_day(datetime.date.fromisoformat(day))
+        except Exception:
+            client.sadd(DIRTY_DAYS_KEY, day)
+            raise
+        rebuilt.append(day)
+    return rebuilt
+
+
+def _dirty_days() -> set[datetime.date]:
+    try:
+        days = get_redis().smembers(DIRTY_DAYS_KEY)
+    except redis.RedisError:
+        # без Redis считаем итоги актуальными
+        return set()
+    return {
+        datetime.date.fromisoformat(day.decode() if isinstance(day, bytes) else day)
+        for day in days
+    }
+
+
+def split_period(
+    start: datetime.datetime, end: datetime.datetime
+) -> tuple[list[AnalyticsRollup], list[tuple[datetime.datetime, datetime.datetime]]]:
+    """Делит период [start, end), выровненный по дням, на итоги закрытых дней
+    и отрезки из подряд идущих открытых дней до конца сегодняшнего
+    """
+    today_start, today_end = timeseries.day_bounds(timeseries.local_today())
+    dirty = _dirty_days()
+    closed = {}
+    for row in AnalyticsRollup.objects.filter(
+        granularity=AnalyticsRollup.DAY,
+        bucket__gte=start,
+        bucket__lt=min(end, today_start),
+    ):
+        day = row.bucket.astimezone(timeseries.ANALYTICS_TZ).date()
+        if day not in dirty:
+            closed[day] = row
+
+    spans = []
+    for bucket in timeseries.buckets(start, min(end, today_end), timeseries.DAY):
+        if bucket.date() in closed:
+            continue
+        day_start, day_end = timeseries.day_bounds(bucket.date())
+        if spans and spans[-1][1] == day_start:
+            spans[-1] = (spans[-1][0], day_end)
+        else:
+            spans.append((day_start, day_end))
+    return list(closed.values()), spans
+
+
+def is_closed(day: datetime.date) -> bool:
+    """Итоги дня посчитаны и не устарели"""
+    if day >= timeseries.local_today():
+        return False
+    return not split_period(*timeseries.day_bounds(day))[1]
+
+
+def totals(start: datetime.date = None, end: datetime.date = None) -> dict:
+    """Суммы метрик за дни [start, end], без границ -- за всё время.
+    Закрытые дни берутся из итогов, открытые считаются по исходным таблицам
+    """
+    today = timeseries.local_today()
+    if start is None:
+        # раньше первой регистрации пополнений и открытий быть не может
+        first = User.objects.aggregate(first=Min("date_joined"))["first"]
+        start = first.astimezone(timeseries.ANALYTICS_TZ).date() if first else today
+    if end is None:
+        end = today
+
+    rows, spans = split_period(
+        timeseries.day_bounds(start)[0], timeseries.day_bounds(end)[1]
+    )
+    values = {
+        name: _number(name, sum(getattr(row, name) for row in rows)) for name in METRICS
+    }
+    for span_start, span_end in spans:
+        for name, value in compute_period(span_start, span_end).items():
+            values[name] += value
+    return values
+
+
+def series(
+    start: datetime.datetime, end: datetime.datetime, granularity: str
+) -> list[dict]:
+    """Метрики по отрезкам [start, end) в формате timeseries.time_series.
+    Закрытые дни берутся из часовых или дневных итогов, открытые считаются
+    по исходным таблицам
+    """
+    records = {
+        timeseries.bucket_date(bucket, granularity): {
+            name: _number(name, 0) for name in METRICS
+        }
+        for bucket in timeseries.buckets(start, end, granularity)
+    }
+
+    rows, spans = split_period(start, end)
+    if granularity == timeseries.HOUR:
+        closed = {timeseries.bucket_date(row.bucket, timeseries.DAY) for row in rows}
+        rows = [
+            row
+            for row in AnalyticsRollup.objects.filter(
+                granularity=AnalyticsRollup.HOUR, bucket__gte=start, bucket__lt=end
+            )
+            if timeseries.bucket_date(row.bucket, timeseries.DAY) in closed
+        ]
+    for row in rows:
+        values = records[timeseries.bucket_date(row.bucket, granularity)]
+        for name in METRICS:
+            values[name] += getattr(row, name)
+
+    for span_start, span_end in spans:
+        for queryset, field, aggregates in _sources():
+            for row in timeseries.time_series(
+                queryset, field, span_start, span_end, granularity, **aggregates
+            ):
+                values = records[row.pop("date")]
+                for name, value in row.items():
+                    values[name] += _number(name, value)
+
+    return [{"date": date, **values} for date, values in records.items()]
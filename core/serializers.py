@@ -16,6 +16,14 @@ class AdminAnalyticsCommonData(serializers.Serializer):
     ggr = serializers.FloatField()
 
 
+class AdminAnalyticsGateway(serializers.Serializer):
+    provider = serializers.CharField()
+    calls = serializers.IntegerField()
+    errors = serializers.IntegerField()
+    avg_ms = serializers.FloatField(allow_null=True)
+    circuit_open = serializers.BooleanField()
+
+
 class FooterSerializer(serializers.Serializer):
     opened_cases = serializers.IntegerField()
     total_users = serializers.IntegerField()
@@ -27,40 +35,52 @@ class FooterSerializer(serializers.Serializer):
 ### graphics serializer ###
 
 
+class TimeBucketField(serializers.Field):
+    """Начало отрезка графика: дата для дней и недель, время для часов"""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return value.isoformat()
+
+
 class AdminAnalyticsIncome(serializers.Serializer):
     income = serializers.FloatField()
-    date = serializers.DateField()
+    date = TimeBucketField()
 
 
 class AdminAnalyticsOutlay(serializers.Serializer):
     outlay = serializers.FloatField()
-    date = serializers.DateField()
+    date = TimeBucketField()
 
 
 class AdminAnalyticsClearProfit(serializers.Serializer):
     profit = serializers.FloatField()
-    date = serializers.DateField()
+    date = TimeBucketField()
 
 
 class AdminAnalyticsCountOpenCases(serializers.Serializer):
     count = serializers.IntegerField()
-    date = serializers.DateField()
+    date = TimeBucketField()
 
 
 class AdminAnalyticsAverageCheck(serializers.Serializer):
     check = serializers.FloatField()
-    date = serializers.DateField()
+    date = TimeBucketField()
 
 
 class AdminAnalyticsCountRegUser(serializers.Serializer):
     count = serializers.IntegerField()
-    date = serializers.DateField()
+    date = TimeBucketField()
 
 
 class AdminAnalyticsIncomeByCaseType(serializers.Serializer):
     case_name = serializers.CharField()
     count_open = serializers.IntegerField()
     income = serializers.FloatField()
+    rtp = serializers.FloatField(help_text="Доля стоимости выпавших предметов")
     date = serializers.DateField()
 
 
@@ -0,0 +1,36 @@
+from celery import shared_task
+
+from core import counters, leaderboards, rollups
+from utils.decorators import single_task
+
+
+@shared_task
+@single_task(10 * 60)
+def reconcile_site_counters():
+    """Сверка счётчиков подвала с базой.
+    Рассчитана на запуск раз в 10-30 минут
+    """
+    values = counters.reconcile()
+    return ", ".join(f"{name}: {value}" for name, value in values.items())
+
+
+@shared_task
+@single_task(30 * 60)
+def update_analytics_rollups():
+    """Пересчёт итогов аналитики за изменённые дни.
+    Рассчитана на запуск раз в 5-10 минут
+    """
+    days = rollups.rebuild_dirty_days()
+    return f"Пересчитаны итоги за {len(days)} дней"
+
+
+@shared_task
+@single_task(10 * 60)
+def rebuild_leaderboards():
+    """Пересборка топов в Redis по базе, нужна только с REDIS_LEADERBOARDS.
+    Рассчитана на запуск раз в час
+    """
+    if not leaderboards.enabled():
+        return "Топы в Redis выключены"
+    count = leaderboards.rebuild()
+    return f"Пересобраны топы, рефералов: {count}"
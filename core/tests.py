@@ -1,3 +1,79 @@
+import datetime
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from core import rollups, timeseries
+from core.models import AnalyticsRollup
+from payments.models import PaymentOrder
+from utils.redis_client import get_redis
+
+
+class RollupTotalsTest(TestCase):
+    def setUp(self):
+        get_redis().delete(rollups.DIRTY_DAYS_KEY)
+        self.addCleanup(get_redis().delete, rollups.DIRTY_DAYS_KEY)
+        self.yesterday = timeseries.local_today() - datetime.timedelta(days=1)
+        noon = datetime.datetime.combine(
+            self.yesterday, datetime.time(12), timeseries.ANALYTICS_TZ
+        )
+        self.user = User.objects.create(
+            username="payer", date_joined=noon - datetime.timedelta(days=2)
+        )
+        self.order = PaymentOrder.objects.create(
+            user=self.user, sum=100, status=PaymentOrder.SUCCESS
+        )
+        PaymentOrder.objects.filter(id=self.order.id).update(created_at=noon)
+
+    def test_days_without_rollups_are_counted_from_raw_tables(self):
+        self.assertFalse(AnalyticsRollup.objects.exists())
+
+        self.assertEqual(rollups.totals()["deposits_sum"], 100)
+        self.assertEqual(
+            rollups.totals(self.yesterday, self.yesterday)["deposits_count"], 1
+        )
+
+    def test_closed_days_are_read_from_rollups(self):
+        rollups.rebuild_day(self.yesterday)
+        # без сигналов день остаётся закрытым
+        PaymentOrder.objects.filter(id=self.order.id).update(sum=300)
+
+        self.assertEqual(rollups.totals()["deposits_sum"], 100)
+        self.assertTrue(rollups.is_closed(self.yesterday))
+
+    def test_dirty_days_are_counted_from_raw_tables(self):
+        rollups.rebuild_day(self.yesterday)
+        self.order.refresh_from_db()
+        self.order.sum = 300
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+
+        self.assertFalse(rollups.is_closed(self.yesterday))
+        self.assertEqual(rollups.totals()["deposits_sum"], 300)
+
+        rollups.rebuild_dirty_days()
+        self.assertTrue(rollups.is_closed(self.yesterday))
+        self.assertEqual(rollups.totals()["deposits_sum"], 300)
+
+    def test_today_is_never_closed(self):
+        rollups.rebuild_day(timeseries.local_today())
+
+        self.assertFalse(rollups.is_closed(timeseries.local_today()))
+
+    def test_series_reads_closed_hours_and_counts_today_raw(self):
+        rollups.rebuild_day(self.yesterday)
+        PaymentOrder.objects.filter(id=self.order.id).update(sum=300)
+        PaymentOrder.objects.create(user=self.user, sum=50, status=PaymentOrder.SUCCESS)
+        start = timeseries.day_bounds(self.yesterday)[0]
+        end = timeseries.day_bounds(timeseries.local_today())[1]
+
+        days = rollups.series(start, end, timeseries.DAY)
+        hours = rollups.series(start, end, timeseries.HOUR)
+
+        self.assertEqual(
+            [(day["date"], day["deposits_sum"]) for day in days],
+            [(self.yesterday, 100), (timeseries.local_today(), 50)],
+        )
+        self.assertEqual(len(hours), 48)
+        self.assertEqual(hours[12]["deposits_sum"], 100)
+        self.assertEqual(sum(hour["deposits_sum"] for hour in hours[24:]), 50)
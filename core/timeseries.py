@@ -0,0 +1,114 @@
+"""Временные ряды для графиков аналитики.
+
+Ряд строится одним запросом: поле даты обрезается до начала часа, дня или
+недели по московскому времени, значения агрегируются GROUP BY по этому
+отрезку. Отрезки без записей дозаполняются в Python пустыми значениями.
+"""
+
+import datetime
+import zoneinfo
+
+from django.db.models.functions import TruncDay, TruncHour, TruncWeek
+
+ANALYTICS_TZ = zoneinfo.ZoneInfo("Europe/Moscow")
+DEFAULT_PERIOD_DAYS = 7
+
+HOUR = "hour"
+DAY = "day"
+WEEK = "week"
+GRANULARITIES = {
+    HOUR: (TruncHour, datetime.timedelta(hours=1)),
+    DAY: (TruncDay, datetime.timedelta(days=1)),
+    WEEK: (TruncWeek, datetime.timedelta(weeks=1)),
+}
+
+
+def parse_period(
+    start_date: str = None, end_date: str = None
+) -> tuple[datetime.datetime, datetime.datetime]:
+    """Начало первого и конец последнего дня периода по московскому времени.
+    Даты в формате YYYY-MM-DD, по умолчанию последние DEFAULT_PERIOD_DAYS дней
+    """
+    today = local_today()
+    if start_date:
+        start = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
+    else:
+        start = today - datetime.timedelta(days=DEFAULT_PERIOD_DAYS)
+    if end_date:
+        end = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+    else:
+        end = today
+    return day_bounds(start)[0], day_bounds(end)[1]
+
+
+def day_bounds(day: datetime.date) -> tuple[datetime.datetime, datetime.datetime]:
+    """Начало дня и начало следующего дня по московскому времени"""
+    start = datetime.datetime.combine(day, datetime.time(), ANALYTICS_TZ)
+    return start, start + datetime.timedelta(days=1)
+
+
+def local_today() -> datetime.date:
+    return datetime.datetime.now(ANALYTICS_TZ).date()
+
+
+def _truncate(moment: datetime.datetime, granularity: str) -> datetime.datetime:
+    moment = moment.astimezone(ANALYTICS_TZ)
+    if granularity == HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == WEEK:
+        moment -= datetime.timedelta(days=moment.weekday())
+    return moment
+
+
+def bucket_date(moment: datetime.datetime, granularity: str):
+    """Отрезок, в который попадает moment, в формате записей time_series"""
+    bucket = _truncate(moment, granularity)
+    return bucket if granularity == HOUR else bucket.date()
+
+
+def buckets(
+    start: datetime.datetime, end: datetime.datetime, granularity: str
+) -> list[datetime.datetime]:
+    """Начала всех отрезков, пересекающихся с периодом [start, end)"""
+    step = GRANULARITIES[granularity][1]
+    result = []
+    # шаг считается в местном времени, отрезок всегда начинается с полуночи
+    current = _truncate(start, granularity).replace(tzinfo=None)
+    end = end.astimezone(ANALYTICS_TZ).replace(tzinfo=None)
+    while current < end:
+        result.append(current.replace(tzinfo=ANALYTICS_TZ))
+        current += step
+    return result
+
+
+def time_series(
+    queryset,
+    field: str,
+    start: datetime.datetime,
+    end: datetime.datetime,
+    granularity: str = DAY,
+    **aggregates,
+) -> list[dict]:
+    """Агрегаты queryset по отрезкам поля field за период [start, end).
+
+    Каждая запись содержит date -- начало отрезка (дату для дней и недель,
+    время для часов) и значения aggregates, для пустых отрезков None.
+    """
+    trunc = GRANULARITIES[granularity][0]
+    rows = (
+        queryset.filter(**{f"{field}__gte": start, f"{field}__lt": end})
+        .annotate(bucket=trunc(field, tzinfo=ANALYTICS_TZ))
+        .values("bucket")
+        .annotate(**aggregates)
+        .order_by("bucket")
+    )
+    values = {row.pop("bucket"): row for row in rows}
+
+    empty = dict.fromkeys(aggregates)
+    records = []
+    for bucket in buckets(start, end, granularity):
+        row = values.get(bucket, empty)
+        date = bucket if granularity == HOUR else bucket.date()
+        records.append({"date": date, **row})
+    return records
@@ -20,6 +20,11 @@ urlpatterns = [
         views.AdminAnalyticsViewSet.as_view({"get": "common_data"}),
         name="admin_analytics_common",
     ),
+    path(
+        "6383d341-4d14-4868-81ba-3c6382f2128e/analytics/gateways",
+        views.AdminAnalyticsViewSet.as_view({"get": "gateways"}),
+        name="admin_analytics_gateways",
+    ),
     path(
         "6383d341-4d14-4868-81ba-3c6382f2128e/analytics/graphics/income/<str:start_date>/<str:end_date>",
         views.AdminAnalyticsViewSet.as_view({"get": "graphic_income"}),
@@ -1,24 +1,26 @@
-from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from django_filters import rest_framework as filters
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets, status
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAdminUser, AllowAny
 
+from core import counters, leaderboards, rollups, timeseries
 from core.models import GenericSettings
-from cases.models import OpenedCases, Case
-from payments.models import Output, PurchaseCompositeItems
-from users.models import UserItems, UserProfile
+from cases.models import Case
+from gateways import transport
+from users import presence
+from users.models import UserItems
 
-from legadrop.settings import REDIS_CONNECTION_STRING
 
 from core.serializers import (
     AdminAnalyticsSerializer,
     AdminAnalyticsCommonData,
+    AdminAnalyticsGateway,
     FooterSerializer,
     AdminGenericSettingsSerializer,
     AdminAnalyticsIncome,
@@ -35,10 +37,18 @@ from core.serializers import (
 from payments.models import PaymentOrder
 
 
-import redis
 import datetime
 
 
+GRAPHIC_DESCRIPTION = (
+    "Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю. "
+    "Отрезки считаются по московскому времени"
+)
+GRANULARITY_PARAMETER = OpenApiParameter(
+    "granularity", str, enum=list(timeseries.GRANULARITIES), default=timeseries.DAY
+)
+
+
 class BaseDateFilter(filters.FilterSet):
     from_date = filters.DateFilter(field_name="created_at", lookup_expr="gte")
     to_date = filters.DateFilter(field_name="created_at", lookup_expr="lte")
@@ -59,6 +69,7 @@ class AdminAnalyticsViewSet(ModelViewSet):
         serializer = {
             "list": AdminAnalyticsSerializer,
             "common_data": AdminAnalyticsCommonData,
+            "gateways": AdminAnalyticsGateway,
             "graphic_income": AdminAnalyticsIncome,
             "graphic_outlay": AdminAnalyticsOutlay,
             "graphic_clear_profit": AdminAnalyticsClearProfit,
@@ -75,328 +86,220 @@ class AdminAnalyticsViewSet(ModelViewSet):
         description="Формат даты YYYY-MM-DD. По дефолту будет отдавать текущий день"
     )
     def list(self, request, *args, **kwargs):
-        default_filter = dict()
-        default_user_filter = dict()
-        if "from_date" not in request.query_params:
-            default_from = timezone.localtime().replace(
-                hour=0, minute=0, second=0, microsecond=0
+        today = timeseries.local_today()
+        try:
+            start = datetime.date.fromisoformat(
+                request.query_params.get("from_date", today.isoformat())
             )
-            default_filter["created_at__gte"] = default_from
-            default_user_filter["date_joined__gte"] = default_from.isoformat()
-        else:
-            default_user_filter["date_joined__gte"] = timezone.datetime.strptime(
-                request.query_params["from_date"], "%Y-%m-%d"
-            )
-        if "to_date" not in request.query_params:
-            default_to = timezone.localtime().replace(
-                hour=23, minute=59, second=59, microsecond=50
-            )
-            default_filter["created_at__lte"] = default_to
-            default_user_filter["date_joined__lte"] = default_to.isoformat()
-        else:
-            default_user_filter["date_joined__lte"] = timezone.datetime.strptime(
-                request.query_params["from_date"], "%Y-%m-%d"
+            end = datetime.date.fromisoformat(
+                request.query_params.get("to_date", today.isoformat())
             )
+        except ValueError:
+            raise ValidationError({"message": "Формат даты YYYY-MM-DD"})
 
-        queryset = self.filter_queryset(self.get_queryset().filter(**default_filter))
-        total_income = queryset.aggregate(Sum("sum"))["sum__sum"] or 0
-        total_expense = Output.objects.filter(
-            active=False, status="completed"
-        ).aggregate(Sum("withdrawal_price"))
-        total_expense = total_expense["withdrawal_price__sum"] or 0
-        count_users = User.objects.filter(
-            **default_user_filter, is_staff=False, is_superuser=False
-        ).count()
+        period = rollups.totals(start, end)
+        total_income = period["deposits_sum"]
+        total_expense = rollups.totals()["withdrawals_sum"]
         data = dict(
             total_expense=total_expense,
             total_income=total_income,
             profit=total_income - total_expense,
-            count_users=count_users,
+            count_users=period["registrations"],
         )
 
         serializer = self.get_serializer(data)
         return Response(serializer.data)
 
     def common_data(self, request, *args, **kwargs):
-        opened_cases = OpenedCases.objects.filter(
-            open_date__gte=timezone.localdate()
-        ).count()
-        count_users = User.objects.filter(is_staff=False, is_superuser=False).count()
-        total_income = self.get_queryset().aggregate(Sum("sum"))["sum__sum"] or 0
+        today = timeseries.local_today()
+        opened_cases = rollups.totals(today, today)["openings"]
+        all_time = rollups.totals()
+        count_users = all_time["registrations"]
+        total_income = all_time["deposits_sum"]
 
         if not total_income or not count_users:
             average_income = 0
         else:
             average_income = total_income / count_users
 
-        total_expense = Output.objects.filter(
-            active=False, status="completed"
-        ).aggregate(Sum("withdrawal_price"))
-        total_expense = total_expense["withdrawal_price__sum"] or 0
-        ggr = total_income - total_expense
+        ggr = total_income - all_time["withdrawals_sum"]
 
         serializer = self.get_serializer(
             {
                 "total_open": opened_cases,
-                "online": 1,
+                "online": presence.count_online(),
                 "average_income": average_income,
                 "ggr": ggr,
             }
         )
         return Response(serializer.data)
 
-    ### graphics views ###
-
     @extend_schema(
-        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю"
+        description="Вызовы, ошибки и среднее время ответа внешних API за последние minutes минут",
+        parameters=[OpenApiParameter("minutes", int, required=False)],
     )
-    def graphic_income(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-        seven_days_ago = current_date - datetime.timedelta(days=7)
-
-        kw_start_date = kwargs.get("start_date", seven_days_ago.strftime("%Y-%m-%d"))
-        kw_end_date = kwargs.get("end_date", current_date.strftime("%Y-%m-%d"))
+    def gateways(self, request, *args, **kwargs):
+        try:
+            minutes = int(request.query_params.get("minutes", 60))
+        except ValueError:
+            raise ValidationError({"message": "minutes должно быть числом"})
+        if not 0 < minutes <= transport.METRICS_TTL // 60:
+            raise ValidationError(
+                {"message": f"minutes от 1 до {transport.METRICS_TTL // 60}"}
+            )
 
-        start_date = datetime.datetime.strptime(kw_start_date, "%Y-%m-%d")
-        end_date = datetime.datetime.strptime(kw_end_date, "%Y-%m-%d")
+        data = [
+            dict(provider=provider, **transport.get_metrics(provider, minutes))
+            for provider in transport.PROVIDERS
+        ]
+        serializer = self.get_serializer(data, many=True)
+        return Response(serializer.data)
 
-        payments = PaymentOrder.objects.filter(
-            created_at__range=(start_date, end_date), status=PaymentOrder.SUCCESS
-        )
-        records = []
+    ### graphics views ###
 
-        cur_date = start_date
-        while cur_date <= end_date:
-            next_date = cur_date + datetime.timedelta(days=1)
-            income = (
-                payments.filter(created_at__date=cur_date.date()).aggregate(Sum("sum"))[
-                    "sum__sum"
-                ]
-                or 0
+    def _graphic_series(self):
+        granularity = self.request.query_params.get("granularity", timeseries.DAY)
+        if granularity not in timeseries.GRANULARITIES:
+            raise ValidationError({"granularity": "Допустимо: hour, day, week"})
+        try:
+            start, end = timeseries.parse_period(
+                self.kwargs.get("start_date"), self.kwargs.get("end_date")
             )
-            records.append({"income": income, "date": cur_date.date()})
-            cur_date = next_date
+        except ValueError:
+            raise ValidationError({"message": "Формат даты YYYY-MM-DD"})
+        return rollups.series(start, end, granularity)
+
+    @extend_schema(
+        description=GRAPHIC_DESCRIPTION,
+        parameters=[GRANULARITY_PARAMETER],
+    )
+    def graphic_income(self, request, *args, **kwargs):
+        records = [
+            {"income": record["deposits_sum"], "date": record["date"]}
+            for record in self._graphic_series()
+        ]
 
         serializer = self.get_serializer(records, many=True)
 
         return Response(serializer.data)
 
     @extend_schema(
-        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю"
+        description=GRAPHIC_DESCRIPTION,
+        parameters=[GRANULARITY_PARAMETER],
     )
     def graphic_outlay(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-        seven_days_ago = current_date - datetime.timedelta(days=7)
-
-        kw_start_date = kwargs.get("start_date", seven_days_ago.strftime("%Y-%m-%d"))
-        kw_end_date = kwargs.get("end_date", current_date.strftime("%Y-%m-%d"))
-
-        start_date = datetime.datetime.strptime(kw_start_date, "%Y-%m-%d")
-        end_date = datetime.datetime.strptime(kw_end_date, "%Y-%m-%d")
-
-        outputs = Output.objects.filter(
-            created_at__range=(start_date, end_date), status=Output.COMPLETED
-        )
-
-        records = []
-        cur_date = start_date
-        while cur_date <= end_date:
-
-            sum_ = 0.0
-            next_date = cur_date + datetime.timedelta(days=1)
-            outlays = outputs.filter(created_at__date=cur_date.date()).all()
-
-            for outlay in outlays:
-                sum_ += outlay.cost_withdrawal_of_items_in_rub
-
-            records.append({"outlay": sum_, "date": cur_date.date()})
-
-            cur_date = next_date
+        records = [
+            {"outlay": record["outlay_sum"], "date": record["date"]}
+            for record in self._graphic_series()
+        ]
 
         serializer = self.get_serializer(records, many=True)
 
         return Response(serializer.data)
 
     @extend_schema(
-        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю"
+        description=GRAPHIC_DESCRIPTION,
+        parameters=[GRANULARITY_PARAMETER],
     )
     def graphic_clear_profit(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-        seven_days_ago = current_date - datetime.timedelta(days=7)
-
-        kw_start_date = kwargs.get("start_date", seven_days_ago.strftime("%Y-%m-%d"))
-        kw_end_date = kwargs.get("end_date", current_date.strftime("%Y-%m-%d"))
-
-        start_date = datetime.datetime.strptime(kw_start_date, "%Y-%m-%d")
-        end_date = datetime.datetime.strptime(kw_end_date, "%Y-%m-%d")
-
-        outputs = Output.objects.filter(
-            created_at__range=(start_date, end_date), status=Output.COMPLETED
-        )
-        payments = PaymentOrder.objects.filter(
-            created_at__range=(start_date, end_date), status=PaymentOrder.SUCCESS
-        )
-
-        records = []
-        cur_date = start_date
-        while cur_date <= end_date:
-            outlay_sum = 0.0
-
-            next_date = cur_date + datetime.timedelta(days=1)
-
-            income = (
-                payments.filter(created_at__date=cur_date.date()).aggregate(Sum("sum"))[
-                    "sum__sum"
-                ]
-                or 0
-            )
-
-            outlays = outputs.filter(created_at__date=cur_date.date()).all()
-
-            for outlay in outlays:
-                outlay_sum += outlay.cost_withdrawal_of_items_in_rub
-
-            if outlay_sum == 0.0:
-                profit = income
-            else:
-                profit = float(income) - outlay_sum
-
-            records.append({"profit": profit, "date": cur_date.date()})
-
-            cur_date = next_date
+        records = [
+            {
+                "profit": record["deposits_sum"] - record["outlay_sum"],
+                "date": record["date"],
+            }
+            for record in self._graphic_series()
+        ]
 
         serializer = self.get_serializer(records, many=True)
 
         return Response(serializer.data)
 
     @extend_schema(
-        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю"
+        description=GRAPHIC_DESCRIPTION,
+        parameters=[GRANULARITY_PARAMETER],
     )
     def graphic_count_open_cases(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-        seven_days_ago = current_date - datetime.timedelta(days=7)
-
-        kw_start_date = kwargs.get("start_date", seven_days_ago.strftime("%Y-%m-%d"))
-        kw_end_date = kwargs.get("end_date", current_date.strftime("%Y-%m-%d"))
-
-        start_date = datetime.datetime.strptime(kw_start_date, "%Y-%m-%d")
-        end_date = datetime.datetime.strptime(kw_end_date, "%Y-%m-%d")
-
-        open_cases = OpenedCases.objects.filter(open_date__range=(start_date, end_date))
-
-        records = []
-
-        cur_date = start_date
-        while cur_date <= end_date:
-            records.append(
-                {
-                    "count": open_cases.filter(open_date__date=cur_date.date()).count(),
-                    "date": cur_date.date(),
-                }
-            )
-            cur_date += datetime.timedelta(days=1)
+        records = [
+            {"count": record["openings"], "date": record["date"]}
+            for record in self._graphic_series()
+        ]
 
         serializer = self.get_serializer(records, many=True)
 
         return Response(serializer.data)
 
     @extend_schema(
-        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю"
+        description=GRAPHIC_DESCRIPTION,
+        parameters=[GRANULARITY_PARAMETER],
     )
     def graphic_average_check(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-        seven_days_ago = current_date - datetime.timedelta(days=7)
-
-        kw_start_date = kwargs.get("start_date", seven_days_ago.strftime("%Y-%m-%d"))
-        kw_end_date = kwargs.get("end_date", current_date.strftime("%Y-%m-%d"))
-
-        start_date = datetime.datetime.strptime(kw_start_date, "%Y-%m-%d")
-        end_date = datetime.datetime.strptime(kw_end_date, "%Y-%m-%d")
-
-        payments = PaymentOrder.objects.filter(
-            created_at__range=(start_date, end_date), status=PaymentOrder.SUCCESS
-        )
         records = []
-
-        cur_date = start_date
-        while cur_date <= end_date:
-            next_date = cur_date + datetime.timedelta(days=1)
-
-            payments_cur_date = payments.filter(created_at__date=cur_date.date())
-
-            income = payments_cur_date.aggregate(Sum("sum"))["sum__sum"] or 0
-
-            if income == 0 or payments_cur_date.count() == 0:
-                check = 0
-            else:
-                check = income / payments_cur_date.count()
-
-            records.append({"check": check, "date": cur_date.date()})
-            cur_date = next_date
+        for record in self._graphic_series():
+            count = record["deposits_count"]
+            check = record["deposits_sum"] / count if count else 0
+            records.append({"check": check, "date": record["date"]})
 
         serializer = self.get_serializer(records, many=True)
 
         return Response(serializer.data)
 
     @extend_schema(
-        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю"
+        description=GRAPHIC_DESCRIPTION,
+        parameters=[GRANULARITY_PARAMETER],
     )
     def graphic_count_reg_users(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-        seven_days_ago = current_date - datetime.timedelta(days=7)
-
-        kw_start_date = kwargs.get("start_date", seven_days_ago.strftime("%Y-%m-%d"))
-        kw_end_date = kwargs.get("end_date", current_date.strftime("%Y-%m-%d"))
-
-        start_date = datetime.datetime.strptime(kw_start_date, "%Y-%m-%d")
-        end_date = datetime.datetime.strptime(kw_end_date, "%Y-%m-%d")
-
-        users = User.objects.filter(date_joined__range=[start_date, end_date])
-
-        records = []
-
-        cur_date = start_date
-        while cur_date <= end_date:
-            records.append(
-                {
-                    "count": users.filter(date_joined__date=cur_date.date()).count(),
-                    "date": cur_date.date(),
-                }
-            )
-            cur_date += datetime.timedelta(days=1)
+        records = [
+            {"count": record["registrations"], "date": record["date"]}
+            for record in self._graphic_series()
+        ]
 
         serializer = self.get_serializer(records, many=True)
 
         return Response(serializer.data)
 
     @extend_schema(
-        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за неделю"
+        description="Формат даты YYYY-MM-DD. По дефолту будет отдавать данные за текущий день. "
+        "Демо открытия не учитываются"
     )
     def graphic_income_by_case_type(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-
-        date = kwargs.get("date", current_date.strftime("%Y-%m-%d"))
+        date = kwargs.get("date") or timezone.localtime(
+            timezone=timeseries.ANALYTICS_TZ
+        ).strftime("%Y-%m-%d")
+        try:
+            start, end = timeseries.parse_period(date, date)
+        except ValueError:
+            raise ValidationError({"message": "Формат даты YYYY-MM-DD"})
+
+        if rollups.is_closed(start.date()):
+            # итоги дня посчитаны и не устарели
+            rollup = Q(rollups__date=start.date())
+            cases = Case.objects.annotate(
+                count_open=Sum("rollups__openings", filter=rollup),
+                paid=Sum("rollups__paid", filter=rollup),
+                cost=Sum("rollups__cost", filter=rollup),
+            )
+        else:
+            opening = Q(
+                users_opening__open_date__gte=start,
+                users_opening__open_date__lt=end,
+                users_opening__demo=False,
+            )
+            cases = Case.objects.annotate(
+                count_open=Count("users_opening", filter=opening),
+                paid=Sum("users_opening__case_price", filter=opening),
+                cost=Sum("users_opening__item_cost", filter=opening),
+            )
 
         records = []
-
-        cases = Case.objects.all()
-
-        for case in cases:
-            income = 0.0
-
-            opening = case.users_opening.filter(
-                open_date__date=datetime.datetime.strptime(date, "%Y-%m-%d")
-            ).all()
-            count = opening.count() or 0
-            for open_ in opening:
-                income += float(case.price) - float(open_.item.purchase_price)
-
+        for case in cases.values("name", "count_open", "paid", "cost"):
+            paid, cost = case["paid"] or 0, case["cost"] or 0
             records.append(
                 {
-                    "case_name": case.name,
-                    "count_open": count,
-                    "income": round(income, 2),
-                    "date": datetime.datetime.strptime(date, "%Y-%m-%d").date(),
+                    "case_name": case["name"],
+                    "count_open": case["count_open"] or 0,
+                    "income": round(paid - cost, 2),
+                    "rtp": round(cost / paid, 4) if paid else 0,
+                    "date": start.date(),
                 }
             )
 
@@ -407,61 +310,15 @@ class AdminAnalyticsViewSet(ModelViewSet):
     ### blocks views ###
 
     def block_top_ref(self, request, *args, **kwargs):
-        users = UserProfile.objects.all()
-
-        records = []
-
-        for user in users:
-            count_next = 0
-
-            ref_links = user.ref_links.all()
-
-            for ref in ref_links:
-                ref_activate = ref.activated_links.all()
-                count_next += ref_activate.count()
-
-            records.append(
-                {
-                    "id": user.id,
-                    "name": user.user.username,
-                    "image": str(user.image) or None,
-                    "count_next": count_next,
-                    "total_income": user.total_income,
-                }
-            )
-
-        records = sorted(records, key=lambda x: x["total_income"], reverse=True)
+        records = leaderboards.top_referrers(int(kwargs.get("top")))
 
         serializer = self.get_serializer(records, many=True)
         return Response(serializer.data)
 
     def block_top_users_deposite(self, request, *args, **kwargs):
-        current_date = datetime.datetime.today()
-        back_date = current_date - datetime.timedelta(hours=24)
-
-        top = int(kwargs.get("top"))
-
-        users = UserProfile.objects.all()
-
-        records = []
-
-        for user in users:
-            records.append(
-                {
-                    "id": user.id,
-                    "name": user.user.username,
-                    "image": str(user.image) or None,
-                    "payments_price": user.user.user_payments_orders.filter(
-                        created_at__range=[back_date, current_date],
-                        status=PaymentOrder.SUCCESS,
-                    ).aggregate(Sum("sum"))["sum__sum"]
-                    or 0,
-                }
-            )
-
-        sorted_rec = sorted(records, key=lambda x: x["payments_price"], reverse=True)
-        serializer = self.get_serializer(sorted_rec[:top], many=True)
+        records = leaderboards.top_depositors(int(kwargs.get("top")))
 
+        serializer = self.get_serializer(records, many=True)
         return Response(serializer.data)
 
     def get_user_ltv(self, request, *args, **kwargs):
@@ -474,24 +331,14 @@ class AnalyticsFooterView(APIView):
     permission_classes = [AllowAny]
 
     @extend_schema(responses=FooterSerializer)
-    def get(self, request, r=redis.from_url(REDIS_CONNECTION_STRING)):
+    def get(self, request):
         generic = GenericSettings.load()
-        opened_cases = OpenedCases.objects.all().count() + generic.opened_cases_buff
-        total_users = User.objects.all().count() + generic.users_buff
-
-        users_online = (
-            len(r.zrange("asgi:group:online_users", 0, -1)) + generic.online_buff
-        )
-
-        total_purchase = (
-            UserItems.objects.filter(from_case=False).count() + generic.purchase_buff
-        )
-
-        pci = PurchaseCompositeItems.objects.first()
-
-        total_outputs = (
-            pci.total_crystals if pci != None else 0
-        ) + generic.output_crystal_buff
+        values = counters.get_counters()
+        opened_cases = values[counters.OPENED_CASES] + generic.opened_cases_buff
+        total_users = values[counters.TOTAL_USERS] + generic.users_buff
+        users_online = presence.count_online() + generic.online_buff
+        total_purchase = values[counters.TOTAL_PURCHASE] + generic.purchase_buff
+        total_outputs = values[counters.TOTAL_CRYSTAL] + generic.output_crystal_buff
 
         data = dict(
             opened_cases=opened_cases,
@@ -1,7 +1,64 @@
-import requests
+import threading
+import time
+
 import json
 
+from django.core.cache import cache
+
+from gateways.transport import ECONOMIA, get_transport
+
+CURRENCY_CACHE_KEY = "economia_usdrub"
+# курс считается свежим CURRENCY_TTL секунд, после этого отдаётся устаревшее
+# значение и в фоне запрашивается новое, но не дольше CURRENCY_STALE_TTL
+CURRENCY_TTL = 10 * 60
+CURRENCY_STALE_TTL = 24 * 60 * 60
+
+_rate = {}
+_refresh_lock = threading.Lock()
+
 
 def get_currency() -> dict:
-    response = requests.get(url=f"https://economia.awesomeapi.com.br/last/USD-RUb")
+    response = get_transport(ECONOMIA).get(
+        url=f"https://economia.awesomeapi.com.br/last/USD-RUb"
+    )
     return json.loads(response.content.decode("utf-8"))
+
+
+def _fetch_usd_rub_rate() -> dict:
+    entry = {
+        "rate": float(get_currency()["USDRUB"]["high"]),
+        "fetched_at": time.time(),
+    }
+    _rate.update(entry)
+    cache.set(CURRENCY_CACHE_KEY, entry, CURRENCY_STALE_TTL)
+    return entry
+
+
+def _refresh_usd_rub_rate():
+    try:
+        _fetch_usd_rub_rate()
+    except Exception:
+        # остаёмся на устаревшем курсе до следующей попытки
+        pass
+    finally:
+        _refresh_lock.release()
+
+
+def get_usd_rub_rate() -> float:
+    """Курс доллара к рублю с кэшированием.
+    Свежий курс берётся из памяти процесса или общего кэша, устаревший
+    отдаётся сразу, а обновление идёт в фоновом потоке
+    """
+    entry = _rate
+    if not entry or time.time() - entry["fetched_at"] >= CURRENCY_TTL:
+        entry = cache.get(CURRENCY_CACHE_KEY) or {}
+        if entry:
+            _rate.update(entry)
+
+    if not entry:
+        return _fetch_usd_rub_rate()["rate"]
+
+    if time.time() - entry["fetched_at"] >= CURRENCY_TTL:
+        if _refresh_lock.acquire(blocking=False):
+            threading.Thread(target=_refresh_usd_rub_rate, daemon=True).start()
+    return entry["rate"]
@@ -1,10 +1,11 @@
-import requests
 import json
 
+from gateways.transport import ENKA, get_transport
+
 
 def get_genshin_account(uid: str):
     try:
-        response = requests.get(url=f"https://enka.network/api/uid/{uid}")
+        response = get_transport(ENKA).get(url=f"https://enka.network/api/uid/{uid}")
         return json.loads(response.content.decode("utf-8"))
     except:
         return False
@@ -1,9 +1,10 @@
 from django.conf import settings
 import json
-import requests
 import hashlib
 import hmac
 
+from gateways.transport import FREEKASSA, get_transport
+
 
 class FreeKassaApi:
     def __init__(self) -> None:
@@ -26,7 +27,9 @@ class FreeKassaApi:
 
         json_req.update({"signature": signature})
 
-        response = requests.post(url=self.URL + self.CREATE_ORDER_PATH, json=json_req)
+        response = get_transport(FREEKASSA).post(
+            url=self.URL + self.CREATE_ORDER_PATH, json=json_req
+        )
         content = json.loads(response.content.decode("utf-8"))
         content.update({"status_code": response.status_code})
         return content
@@ -1,17 +1,19 @@
-import requests
 import hmac
 import json
 import hashlib
 
 from django.conf import settings
 
+from gateways.transport import LAVA, get_transport
+
 
 class LavaApi:
-    def __init__(self):
+    def __init__(self, url: str = "https://api.lava.ru"):
 
-        self.URL = "https://api.lava.ru"
+        self.URL = url
         self.SECRETKEY = settings.GATEWAYS_SETTINGS["LAVA_SECRET_KEY"]
         self.SHOP_ID = settings.GATEWAYS_SETTINGS["LAVA_SHOP_ID"]
+        self.transport = get_transport(LAVA)
 
     def _create_order(self, data: dict, router: str = "/business/invoice/create"):
         data = self.SyncSortDict(data)
@@ -24,7 +26,7 @@ class LavaApi:
             hashlib.sha256,
         ).hexdigest()
 
-        response = requests.post(
+        response = self.transport.post(
             self.URL + router,
             json=data,
             headers={
@@ -53,9 +55,10 @@ class LavaApi:
             hashlib.sha256,
         ).hexdigest()
 
-        response = requests.post(
+        response = self.transport.post(
             self.URL + router,
             json=data,
+            idempotent=True,
             headers={
                 "Signature": auth,
                 "Accept": "application/json",
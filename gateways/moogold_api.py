@@ -4,7 +4,8 @@ import hmac
 import hashlib
 import base64
 import json
-import requests
+
+from gateways.transport import MOOGOLD, get_transport
 
 
 class MoogoldApi:
@@ -12,6 +13,7 @@ class MoogoldApi:
         self.SECRETKEY = settings.GATEWAYS_SETTINGS["MOOGOLD_SECRET_KEY"]
         self.PARTNER_ID = settings.GATEWAYS_SETTINGS["MOOGOLD_PARTNER_ID"]
         self.CATEGORY = settings.GATEWAYS_SETTINGS["GENSHIN_CATEGORY"]
+        self.transport = get_transport(MOOGOLD)
 
     def buy_moogold_item(self, product_id, quantity, server, uid):
         order = {
@@ -48,7 +50,7 @@ class MoogoldApi:
             "Content-Type": "application/json",
         }
 
-        response = requests.post(
+        response = self.transport.post(
             url="https://moogold.com/wp-json/v1/api/order/create_order",
             data=order_json,
             headers=headers,
@@ -82,10 +84,11 @@ class MoogoldApi:
             "Content-Type": "application/json",
         }
 
-        response = requests.post(
+        response = self.transport.post(
             url="https://moogold.com/wp-json/v1/api/order/order_detail",
             data=order_json,
             headers=headers,
+            idempotent=True,
         )
 
         return json.loads(response.content.decode("utf-8"))
@@ -116,10 +119,11 @@ class MoogoldApi:
             "Content-Type": "application/json",
         }
 
-        response = requests.post(
+        response = self.transport.post(
             url="https://moogold.com/wp-json/v1/api/user/balance",
             data=order_json,
             headers=headers,
+            idempotent=True,
         )
 
         return json.loads(response.content.decode("utf-8"))
@@ -149,10 +153,11 @@ class MoogoldApi:
             "Content-Type": "application/json",
         }
 
-        response = requests.post(
+        response = self.transport.post(
             url="https://moogold.com/wp-json/v1/api/product/product_detail",
             data=order_json,
             headers=headers,
+            idempotent=True,
         )
 
         return json.loads(response.content.decode("utf-8"))
@@ -1,12 +1,22 @@
 import telebot
 
+_bots = {}
+
+
+def get_bot(token) -> telebot.TeleBot:
+    """Бот на токен создаётся один раз на процесс"""
+    bot = _bots.get(token)
+    if bot is None:
+        bot = _bots[token] = telebot.TeleBot(token)
+    return bot
+
 
 def is_member_chanel(chat_id, user_id, token):
     """
     True - подписан
     False - не подписан
     """
-    bot = telebot.TeleBot(token)
+    bot = get_bot(token)
 
     result = bot.get_chat_member(chat_id, user_id)
 
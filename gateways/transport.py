@@ -0,0 +1,210 @@
+"""Общий HTTP-транспорт шлюзов.
+
+У каждого провайдера один Transport на процесс: requests.Session с пулом
+keep-alive соединений, таймауты на соединение и чтение, ограниченное число
+повторов с джиттером и предохранитель. После FAILURE_THRESHOLD ошибок подряд
+запросы к провайдеру сразу падают с ProviderUnavailable, через
+RECOVERY_TIMEOUT секунд пропускается пробный запрос. Повторяются только
+идемпотентные запросы: GET и явно помеченные проверки статусов, создание
+счетов и закупок не повторяется.
+
+Число вызовов, ошибок и суммарное время ответа пишутся в Redis по провайдеру
+и минуте, get_metrics собирает их за последний час, в админке они отдаются
+через analytics/gateways.
+"""
+
+import datetime
+import random
+import threading
+import time
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+from django.utils import timezone
+
+from utils.redis_client import get_redis
+
+LAVA = "lava"
+MOOGOLD = "moogold"
+FREEKASSA = "freekassa"
+ECONOMIA = "economia"
+ENKA = "enka"
+VK = "vk"
+
+# настройки провайдеров поверх значений по умолчанию Transport
+PROVIDERS = {
+    LAVA: {"pool_size": 16},
+    MOOGOLD: {"pool_size": 4, "read_timeout": 20},
+    FREEKASSA: {},
+    ECONOMIA: {"read_timeout": 5},
+    # enka отвечает 429 при частых запросах, повтор только продлит ожидание
+    ENKA: {"read_timeout": 5, "retries": 0},
+    VK: {"read_timeout": 5},
+}
+
+FAILURE_THRESHOLD = 5
+RECOVERY_TIMEOUT = 30
+RETRY_STATUSES = (429, 502, 503, 504)
+
+METRICS_KEY = "gateway_metrics:{provider}:{minute}"
+METRICS_TTL = 24 * 60 * 60
+
+
+class ProviderUnavailable(requests.ConnectionError):
+    """Предохранитель провайдера разомкнут, запрос не отправлялся"""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, recovery_timeout: float):
+        self.threshold = threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.recovery_timeout:
+                # пробный запрос, следующий ждёт его результата или таймаута
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+
+def _record(provider: str, elapsed: float, error: bool):
+    key = METRICS_KEY.format(
+        provider=provider, minute=timezone.now().strftime("%Y%m%d%H%M")
+    )
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(key, "calls", 1)
+        if error:
+            pipe.hincrby(key, "errors", 1)
+        pipe.hincrbyfloat(key, "time_ms", round(elapsed * 1000, 1))
+        pipe.expire(key, METRICS_TTL)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+class Transport:
+    def __init__(
+        self,
+        provider: str,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        retries: int = 2,
+        backoff: float = 0.3,
+        pool_size: int = 10,
+    ):
+        self.provider = provider
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(FAILURE_THRESHOLD, RECOVERY_TIMEOUT)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _sleep(self, attempt: int):
+        time.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+    def request(
+        self, method: str, url: str, idempotent: bool = None, **kwargs
+    ) -> requests.Response:
+        if idempotent is None:
+            idempotent = method.upper() in ("GET", "HEAD")
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = self.retries + 1 if idempotent else 1
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise ProviderUnavailable(f"{self.provider} недоступен")
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                _record(self.provider, time.monotonic() - started, True)
+                self.breaker.failure()
+                if attempt + 1 == attempts:
+                    raise
+                self._sleep(attempt)
+                continue
+
+            failed = response.status_code >= 500
+            _record(self.provider, time.monotonic() - started, failed)
+            if failed:
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                self._sleep(attempt)
+                continue
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(provider: str) -> Transport:
+    transport = _transports.get(provider)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(provider)
+            if transport is None:
+                transport = Transport(provider, **PROVIDERS.get(provider, {}))
+                _transports[provider] = transport
+    return transport
+
+
+def get_metrics(provider: str, minutes: int = 60) -> dict:
+    """Вызовы, ошибки и среднее время ответа провайдера за последние минуты"""
+    now = timezone.now()
+    keys = [
+        METRICS_KEY.format(
+            provider=provider,
+            minute=(now - datetime.timedelta(minutes=i)).strftime("%Y%m%d%H%M"),
+        )
+        for i in range(minutes)
+    ]
+    pipe = get_redis().pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    calls = errors = time_ms = 0
+    for row in pipe.execute():
+        calls += int(row.get(b"calls", 0))
+        errors += int(row.get(b"errors", 0))
+        time_ms += float(row.get(b"time_ms", 0))
+    transport = _transports.get(provider)
+    return {
+        "calls": calls,
+        "errors": errors,
+        "avg_ms": round(time_ms / calls, 1) if calls else None,
+        "circuit_open": bool(transport and transport.breaker.is_open),
+    }
@@ -0,0 +1,14 @@
+import json
+
+from gateways.transport import VK, get_transport
+
+
+def is_group_member(group_id, user_id, token) -> bool:
+    """
+    True - подписан
+    False - не подписан
+    """
+    response = get_transport(VK).get(
+        f"https://api.vk.com/method/groups.isMember?group_id={group_id}&access_token={token}&user_id={user_id}&v=5.199"
+    )
+    return int(json.loads(response.content.decode("utf-8"))["response"]) == 1
@@ -9,13 +9,20 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from legadrop.routing import websocket_urlpatterns
+from users.ws_auth import JWTAuthMiddleware
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "legadrop.settings")
 
 django_asgi_app = get_asgi_application()
 application = ProtocolTypeRouter(
-    {"http": django_asgi_app, "websocket": URLRouter(websocket_urlpatterns)}
+    {
+        "http": django_asgi_app,
+        "websocket": AuthMiddlewareStack(
+            JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+        ),
+    }
 )
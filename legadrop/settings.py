@@ -68,6 +68,11 @@ REDIS_CONNECTION_STRING = (
     f"redis://{CHANNELS_REDIS_HOST}:{CHANNELS_REDIS_PORT}/{CHANNELS_REDIS_DB}"
 )
 
+REDIS_MAX_CONNECTIONS = env.int("REDIS_MAX_CONNECTIONS", 50)
+REDIS_SOCKET_TIMEOUT = env.float("REDIS_SOCKET_TIMEOUT", 5)
+# топы аналитики из sorted set в Redis вместо запросов в базу, см. core.leaderboards
+REDIS_LEADERBOARDS = env.bool("REDIS_LEADERBOARDS", False)
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -111,10 +116,15 @@ TEMPLATES = [
 
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        "LOCATION": "/var/tmp/legadrop_cache",
+        "BACKEND": "utils.cache.backends.InstrumentedRedisCache",
+        "LOCATION": REDIS_CONNECTION_STRING,
+        "KEY_PREFIX": "legadrop",
         "TIMEOUT": 60,
-        "OPTIONS": {"MAX_ENTRIES": 1000},
+        "OPTIONS": {
+            "max_connections": REDIS_MAX_CONNECTIONS,
+            "socket_timeout": REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": REDIS_SOCKET_TIMEOUT,
+        },
     }
 }
 
@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
+
+
+def invalidate_composite_prices(sender, **kwargs):
+    from cases.pricing import invalidate_pricing
+    from cases.case_cache import invalidate_case_details
+
+    invalidate_pricing()
+    invalidate_case_details()
+
+
+def reverse_calc_balance(sender, instance, **kwargs):
+    instance.reverse_balance()
 
 
 class PaymentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "payments"
+
+    def ready(self):
+        from payments.models import Calc, CompositeItems
+
+        post_save.connect(invalidate_composite_prices, sender=CompositeItems)
+        post_delete.connect(invalidate_composite_prices, sender=CompositeItems)
+        post_delete.connect(reverse_calc_balance, sender=Calc)
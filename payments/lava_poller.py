@@ -0,0 +1,218 @@
+"""Проверка статусов пополнений.
+
+Активные счета LAVA опрашиваются параллельно в POLL_WORKERS потоках через
+общую сессию LavaApi. Чем старше счёт, тем реже он проверяется: интервал
+задаёт BACKOFF, до следующей проверки в Redis живёт ключ NEXT_CHECK_KEY.
+Счета, срок оплаты которых истёк больше EXPIRED_GRACE назад, проверяются
+последний раз: оплаченный зачисляется, любой другой ответ LAVA закрывает счёт
+как просроченный, и больше он не опрашивается. Без ответа счёт остаётся
+активным до следующей попытки. Оплаченные счета зачисляются пачками по
+CREDIT_BATCH_SIZE в одной транзакции, бонусы промокодов и реферальных ссылок
+выбираются сразу на пачку.
+"""
+
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from payments.models import Calc, PaymentOrder, PromoCode
+from utils.redis_client import get_redis
+
+POLL_WORKERS = 16
+CREDIT_BATCH_SIZE = 50
+EXPIRED_GRACE = datetime.timedelta(hours=1)
+NEXT_CHECK_KEY = "lava_poll:wait:{order_id}"
+# возраст счёта и интервал между проверками в секундах
+BACKOFF = (
+    (datetime.timedelta(minutes=10), 0),
+    (datetime.timedelta(hours=1), 60),
+    (datetime.timedelta(hours=6), 5 * 60),
+)
+MAX_INTERVAL = 15 * 60
+
+
+def check_interval(order: PaymentOrder, now: datetime.datetime) -> int:
+    age = now - order.created_at
+    for max_age, interval in BACKOFF:
+        if age < max_age:
+            return interval
+    return MAX_INTERVAL
+
+
+def _key(order: PaymentOrder) -> str:
+    return NEXT_CHECK_KEY.format(order_id=order.id)
+
+
+def due_orders(orders: list[PaymentOrder]) -> list[PaymentOrder]:
+    """Счета, у которых подошло время проверки"""
+    if not orders:
+        return []
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for order in orders:
+            pipe.exists(_key(order))
+        waiting = pipe.execute()
+    except redis.RedisError:
+        # без Redis проверяем всё
+        return orders
+    return [order for order, wait in zip(orders, waiting) if not wait]
+
+
+def postpone(orders: list[PaymentOrder], now: datetime.datetime):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for order in orders:
+            interval = check_interval(order, now)
+            if interval:
+                pipe.set(_key(order), 1, ex=interval)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def fetch_status(lava, order: PaymentOrder) -> str | None:
+    """Статус счёта в LAVA, None -- если ответа не получили"""
+    try:
+        data = lava._get_order_status(invoice_id=order.lava_id, order_id=order.order_id)
+    except Exception:
+        # сетевые ошибки и битые ответы -- проверим при следующем запуске
+        return None
+    # пустая строка -- LAVA ответила, но статуса счёта не знает
+    lava_order = data.get("data") or {}
+    return lava_order.get("status") or ""
+
+
+def fetch_statuses(lava, orders: list[PaymentOrder]) -> list[str | None]:
+    if not orders:
+        return []
+    workers = min(POLL_WORKERS, len(orders))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda order: fetch_status(lava, order), orders))
+
+
+def _bonuses(user_ids) -> tuple[dict, dict]:
+    """Последние неиспользованные бонусы пользователей, как .first()
+    с сортировкой моделей по -id
+    """
+    from users.models import ActivatedLinks, ActivatedPromo
+
+    promos, links = {}, {}
+    for promo in ActivatedPromo.objects.filter(
+        user_id__in=user_ids, promo__type=PromoCode.BONUS, bonus_using=False
+    ).select_related("promo"):
+        promos.setdefault(promo.user_id, promo)
+    for link in ActivatedLinks.objects.filter(
+        user_id__in=user_ids, bonus_using=False
+    ).select_related("link"):
+        links.setdefault(link.user_id, link)
+    return promos, links
+
+
+def credit_order(
+    order: PaymentOrder, service: str, activate_promo=None, activated_link=None
+):
+    """Зачисляет пополнение на баланс с бонусом промокода или ссылки"""
+    user = order.user
+    if activate_promo:
+        comment = f'Пополнение с использованием промокода {activate_promo.promo.name} \
+                   f"{activate_promo.promo.code_data}" пользоватeлем {user.username} на сумму {round(order.sum, 2)} \nService: {service}'
+        balance = float(order.sum) * float(activate_promo.promo.percent)
+    elif activated_link:
+        comment = f'Пополнение с использованием реферальной ссылки {activated_link.link.code_data} \
+                    "{activated_link.link.code_data}" пользоватeлем {user.username} на сумму {round(order.sum, 2)} \nService: {service}'
+        balance = float(order.sum) * float(activated_link.link.bonus)
+    else:
+        comment = f"Пополнение пользоватeлем {user.username} на сумму {round(order.sum, 2)} \nService: {service}"
+        balance = float(order.sum)
+
+    calc = Calc.objects.create(
+        user=user,
+        balance=balance,
+        comment=comment,
+        demo=user.profile.demo,
+        order=order,
+    )
+    if activate_promo:
+        activate_promo.calc_promo.add(calc)
+        activate_promo.save()
+    elif activated_link:
+        activated_link.calc_link.add(calc)
+        activated_link.save()
+
+    order.active = False
+    order.status = order.SUCCESS
+    order.save()
+
+
+def credit_orders(order_ids: list[int], service: str) -> int:
+    """Зачисляет пополнения пачками, каждая пачка -- одна транзакция"""
+    credited = 0
+    for start in range(0, len(order_ids), CREDIT_BATCH_SIZE):
+        batch = order_ids[start : start + CREDIT_BATCH_SIZE]
+        with transaction.atomic():
+            # счёт могли одобрить вручную, пока шёл опрос
+            orders = list(
+                PaymentOrder.objects.select_for_update(of=("self",))
+                .filter(id__in=batch, active=True, user__isnull=False)
+                .select_related("user__profile")
+                .order_by("id")
+            )
+            promos, links = _bonuses({order.user_id for order in orders})
+            seen = set()
+            for order in orders:
+                if order.user_id in seen:
+                    # бонус мог израсходоваться на предыдущем счёте пачки
+                    promos, links = _bonuses([order.user_id])
+                seen.add(order.user_id)
+                credit_order(
+                    order,
+                    service,
+                    promos.get(order.user_id),
+                    links.get(order.user_id),
+                )
+                credited += 1
+    return credited
+
+
+def poll(lava) -> dict[str, int]:
+    """Один проход по активным пополнениям"""
+    now = timezone.now()
+    active = PaymentOrder.objects.filter(active=True)
+
+    freekassa = list(
+        active.filter(type_payments=PaymentOrder.FREEKASSA).values_list("id", flat=True)
+    )
+
+    lava_orders = active.filter(type_payments=PaymentOrder.LAVA).only(
+        "id", "order_id", "lava_id", "created_at"
+    )
+    lapsed_filter = Q(lava_expired__lt=now - EXPIRED_GRACE)
+    # просроченные счета проверяются последний раз перед закрытием
+    lapsed = due_orders(list(lava_orders.filter(lapsed_filter)))
+    orders = due_orders(list(lava_orders.exclude(lapsed_filter)))
+    statuses = fetch_statuses(lava, lapsed + orders)
+
+    paid, cancelled, pending = [], [], []
+    for index, (order, status) in enumerate(zip(lapsed + orders, statuses)):
+        if status == PaymentOrder.SUCCESS:
+            paid.append(order.id)
+        elif status == PaymentOrder.EXPIRED or (
+            status is not None and index < len(lapsed)
+        ):
+            cancelled.append(order.id)
+        else:
+            pending.append(order)
+    postpone(pending, now)
+
+    expired = PaymentOrder.objects.filter(id__in=cancelled, active=True).update(
+        status=PaymentOrder.EXPIRED, active=False, updated_at=now
+    )
+    return {
+        "checked": len(lapsed) + len(orders),
+        "paid": credit_orders(paid, "LAVA") + credit_orders(freekassa, "FREEKASSA"),
+        "expired": expired,
+    }
@@ -0,0 +1,74 @@
+from django.core.management import BaseCommand
+from django.db.models import Sum
+
+from gateways.economia_api import get_usd_rub_rate
+from payments.models import Output, PurchaseCompositeItems
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет стоимость закупки и курс у старых выводов и закупок. "
+        "Исторического курса нет, используется текущий или --rate"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rate", type=float, default=None)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        rate = options["rate"] or get_usd_rub_rate()
+        batch_size = options["batch_size"]
+
+        purchases = PurchaseCompositeItems.objects.filter(
+            price_dollar__isnull=True
+        ).select_related("composite_item")
+        batch, purchases_count = [], 0
+        for purchase in purchases.iterator(chunk_size=batch_size):
+            composite = purchase.composite_item
+            purchase.price_dollar = composite.price_dollar if composite else 0.0
+            purchase.price_rub = round(purchase.price_dollar * rate, 2)
+            purchase.usd_rub_rate = rate
+            batch.append(purchase)
+            if len(batch) >= batch_size:
+                purchases_count += self._update(
+                    PurchaseCompositeItems,
+                    batch,
+                    ["price_dollar", "price_rub", "usd_rub_rate"],
+                )
+        purchases_count += self._update(
+            PurchaseCompositeItems, batch, ["price_dollar", "price_rub", "usd_rub_rate"]
+        )
+
+        # у вывода с закупками стоимость -- сумма закупок, иначе расчёт по предметам
+        outputs = Output.objects.filter(cost_rub__isnull=True).annotate(
+            purchases_dollar=Sum("purchase_ci_outputs__price_dollar")
+        )
+        batch, outputs_count = [], 0
+        for output in outputs.iterator(chunk_size=batch_size):
+            if output.purchases_dollar is not None:
+                output.cost_dollar = output.purchases_dollar
+            else:
+                output.cost_dollar = output.calculate_cost_of_items()
+            output.cost_rub = round(output.cost_dollar * rate, 2)
+            output.usd_rub_rate = rate
+            batch.append(output)
+            if len(batch) >= batch_size:
+                outputs_count += self._update(
+                    Output, batch, ["cost_dollar", "cost_rub", "usd_rub_rate"]
+                )
+        outputs_count += self._update(
+            Output, batch, ["cost_dollar", "cost_rub", "usd_rub_rate"]
+        )
+
+        self.stdout.write(
+            f"Курс {rate}, заполнено закупок: {purchases_count}, "
+            f"выводов: {outputs_count}"
+        )
+
+    @staticmethod
+    def _update(model, batch: list, fields: list[str]) -> int:
+        count = len(batch)
+        if count:
+            model.objects.bulk_update(batch, fields)
+            batch.clear()
+        return count
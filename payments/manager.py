@@ -134,6 +134,9 @@ class PaymentManager:
             server=moogold_order["account_details"]["Server"],
             user_item=user_item,
             composite_item=composite_item,
+            price_dollar=composite_item.price_dollar,
+            price_rub=round(composite_item.price_dollar * output.usd_rub_rate, 2),
+            usd_rub_rate=output.usd_rub_rate,
         )
         purchase.save()
 
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.9 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0055_alter_output_comment_alter_output_output_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="output",
+            name="cost_dollar",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Стоимость закупки в долларах"
+            ),
+        ),
+        migrations.AddField(
+            model_name="output",
+            name="cost_rub",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Стоимость закупки в рублях"
+            ),
+        ),
+        migrations.AddField(
+            model_name="output",
+            name="usd_rub_rate",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Курс доллара на момент закупки"
+            ),
+        ),
+        migrations.AddField(
+            model_name="purchasecompositeitems",
+            name="price_dollar",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Стоимость в долларах"
+            ),
+        ),
+        migrations.AddField(
+            model_name="purchasecompositeitems",
+            name="price_rub",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Стоимость в рублях"
+            ),
+        ),
+        migrations.AddField(
+            model_name="purchasecompositeitems",
+            name="usd_rub_rate",
+            field=models.FloatField(
+                blank=True, null=True, verbose_name="Курс доллара на момент закупки"
+            ),
+        ),
+    ]
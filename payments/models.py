@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -12,9 +12,10 @@ from utils.functions import (
     get_genshin_server,
     ref_output_id_generator,
 )
-from gateways.economia_api import get_currency
+from gateways.economia_api import get_usd_rub_rate
 from users.models import User, ActivatedPromo
 from cases.models import Item
+from cases.pricing import get_pricing
 
 
 class PaymentOrder(models.Model):
@@ -343,6 +344,41 @@ class Calc(models.Model):
     updated_at = models.DateTimeField(verbose_name="Дата изменения", auto_now=True)
     demo = models.BooleanField(verbose_name="Демо начисление", default=False)
 
+    def save(self, *args, **kwargs):
+        from users.models import UserProfile
+
+        previous = None
+        with transaction.atomic():
+            if not self._state.adding and self.pk:
+                previous = (
+                    Calc.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values("user_id", "balance", "demo")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            current = {
+                "user_id": self.user_id,
+                "balance": self.balance,
+                "demo": self.demo,
+            }
+            if previous == current:
+                return
+            # правка начисления: снимаем старую сумму и проводим новую
+            if previous and previous["user_id"] and previous["balance"]:
+                UserProfile.apply_balance(
+                    previous["user_id"], -previous["balance"], previous["demo"]
+                )
+            if self.user_id and self.balance:
+                UserProfile.apply_balance(self.user_id, self.balance, self.demo)
+
+    def reverse_balance(self):
+        """Снимает начисление с сохранённого баланса, вызывается при удалении"""
+        from users.models import UserProfile
+
+        if self.user_id and self.balance:
+            UserProfile.apply_balance(self.user_id, -self.balance, self.demo)
+
     def __str__(self):
         return f"Начисление {self.calc_id}"
 
@@ -425,6 +461,16 @@ class Output(models.Model):
         max_digits=20,
     )
 
+    cost_dollar = models.FloatField(
+        verbose_name="Стоимость закупки в долларах", null=True, blank=True
+    )
+    cost_rub = models.FloatField(
+        verbose_name="Стоимость закупки в рублях", null=True, blank=True
+    )
+    usd_rub_rate = models.FloatField(
+        verbose_name="Курс доллара на момент закупки", null=True, blank=True
+    )
+
     active = models.BooleanField(verbose_name="Активный", default=True)
 
     remove_user = models.ForeignKey(
@@ -456,33 +502,27 @@ class Output(models.Model):
 
         pay_manager = PaymentManager()
 
-        price_in_dollars = self.cost_withdrawal_of_items
+        self.snapshot_cost(save=False)
 
-        is_output_moogold = pay_manager._enough_money_moogold_balance(price_in_dollars)
+        is_output_moogold = pay_manager._enough_money_moogold_balance(self.cost_dollar)
 
         if not is_output_moogold:
             return "На балансе MOOGOLD не хватает денег", 400
 
         composites = CompositeItems.objects.all()
+        pricing = get_pricing()
 
         crystal_items = self.output_items.filter(item__type=Item.CRYSTAL)
         blessing_items = self.output_items.filter(item__type=Item.BLESSING)
         ghost_items = self.output_items.filter(item__type=Item.GHOST_ITEM)
 
         if crystal_items:
-            crystal_composite = composites.filter(type=CompositeItems.CRYSTAL)
-            value_set = sorted(
-                [i.crystals_quantity for i in crystal_composite], key=lambda x: x
-            )
-
             for crystal_item in crystal_items:
-                combination = crystal_item.item.get_crystal_combinations(
-                    value_set=value_set
+                combination = pricing.crystal_composites(
+                    crystal_item.item.crystals_quantity
                 )
 
-                for com in combination:
-                    com_item = crystal_composite.filter(crystals_quantity=com).get()
-
+                for com_item in combination:
                     if com_item.service == CompositeItems.MOOGOLD:
 
                         pay_manager._create_moogold_output(
@@ -516,16 +556,11 @@ class Output(models.Model):
                 blessing_item.save()
 
         if ghost_items:
-            crystal_composite = composites.filter(type=CompositeItems.CRYSTAL)
-            value_set = [i.crystals_quantity for i in crystal_composite]
-
             for ghost_item in ghost_items:
-                combination = ghost_item.item.get_crystal_combinations(
-                    value_set=value_set
+                combination = pricing.crystal_composites(
+                    ghost_item.item.crystals_quantity
                 )
-                for com in combination:
-                    com_item = crystal_composite.filter(crystals_quantity=com).get()
-
+                for com_item in combination:
                     if com_item.service == CompositeItems.MOOGOLD:
                         pay_manager._create_moogold_output(
                             output=self,
@@ -548,30 +583,44 @@ class Output(models.Model):
             200,
         )
 
+    def snapshot_cost(self, save: bool = True):
+        """Фиксирует стоимость закупки и курс, аналитика читает только их"""
+        self.usd_rub_rate = get_usd_rub_rate()
+        self.cost_dollar = self.calculate_cost_of_items()
+        self.cost_rub = round(self.cost_dollar * self.usd_rub_rate, 2)
+        if save:
+            self.save(update_fields=["usd_rub_rate", "cost_dollar", "cost_rub"])
+
     @cached_property
     def cost_withdrawal_of_items_in_rub(self) -> float:
-        currency = float(get_currency()["USDRUB"]["high"])
+        if self.cost_rub is not None:
+            return self.cost_rub
+        currency = get_usd_rub_rate()
         return round(self.cost_withdrawal_of_items * currency, 2)
 
     @cached_property
     def cost_withdrawal_of_items(self) -> float:
+        if self.cost_dollar is not None:
+            return self.cost_dollar
+        return self.calculate_cost_of_items()
+
+    def calculate_cost_of_items(self) -> float:
+        """Стоимость закупки предметов вывода по текущим ценам"""
         price = 0.0
 
         composites = CompositeItems.objects.all()
+        pricing = get_pricing()
 
         crystal_items = self.output_items.filter(item__type=Item.CRYSTAL)
         blessing_items = self.output_items.filter(item__type=Item.BLESSING)
         ghost_items = self.output_items.filter(item__type=Item.GHOST_ITEM)
 
         if crystal_items:
-            crystal_composite = composites.filter(type=CompositeItems.CRYSTAL)
-            value_set = [i.crystals_quantity for i in crystal_composite]
             for crystal_item in crystal_items:
-                combination = crystal_item.item.get_crystal_combinations(
-                    value_set=value_set
+                combination = pricing.crystal_composites(
+                    crystal_item.item.crystals_quantity
                 )
-                for com in combination:
-                    com_item = crystal_composite.filter(crystals_quantity=com).get()
+                for com_item in combination:
                     price += com_item.price_dollar
 
         if blessing_items:
@@ -580,14 +629,11 @@ class Output(models.Model):
                 price += blessing_composite.price_dollar
 
         if ghost_items:
-            crystal_composite = composites.filter(type=CompositeItems.CRYSTAL)
-            value_set = [i.crystals_quantity for i in crystal_composite]
             for ghost_item in ghost_items:
-                combination = ghost_item.item.get_crystal_combinations(
-                    value_set=value_set
+                combination = pricing.crystal_composites(
+                    ghost_item.item.crystals_quantity
                 )
-                for com in combination:
-                    com_item = crystal_composite.filter(crystals_quantity=com).get()
+                for com_item in combination:
                     price += com_item.price_dollar
         return price
 
@@ -660,7 +706,7 @@ class CompositeItems(models.Model):
 
     @cached_property
     def price_rub(self) -> float:
-        currency = float(get_currency()["USDRUB"]["high"])
+        currency = get_usd_rub_rate()
         return round(currency * self.price_dollar)
 
     class Meta:
@@ -742,6 +788,16 @@ class PurchaseCompositeItems(models.Model):
         related_name="purchase_composite_in_users_item",
     )
 
+    price_dollar = models.FloatField(
+        verbose_name="Стоимость в долларах", null=True, blank=True
+    )
+    price_rub = models.FloatField(
+        verbose_name="Стоимость в рублях", null=True, blank=True
+    )
+    usd_rub_rate = models.FloatField(
+        verbose_name="Курс доллара на момент закупки", null=True, blank=True
+    )
+
     @cached_property
     def total_crystals(self):
         total = PurchaseCompositeItems.objects.aggregate(
@@ -0,0 +1,133 @@
+"""Отслеживание статусов закупок Moogold.
+
+Опрашиваются только закупки активных выводов в незавершённых статусах,
+завершённые и возвращённые больше не проверяются. Запросы идут параллельно
+в POLL_WORKERS потоках, общий темп ограничен REQUESTS_PER_SECOND. Выводы
+обрабатываются пачками по BATCH_SIZE: изменившиеся статусы записываются
+одним bulk_update, завершённость выводов пачки решается одним запросом
+с агрегатами по закупкам.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from core import counters
+from payments.models import Output, PurchaseCompositeItems
+
+POLL_WORKERS = 4
+REQUESTS_PER_SECOND = 5
+BATCH_SIZE = 200
+TERMINAL_STATUSES = (
+    PurchaseCompositeItems.COMPLETED,
+    PurchaseCompositeItems.REFUNDED,
+)
+KNOWN_STATUSES = {status for status, _ in PurchaseCompositeItems.PURCHASE_STATUS}
+
+
+class RateLimiter:
+    """Не больше rate вызовов wait в секунду на все потоки"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def fetch_statuses(manager, purchases: list) -> list[str | None]:
+    if not purchases:
+        return []
+    limiter = RateLimiter(REQUESTS_PER_SECOND)
+
+    def fetch(purchase):
+        limiter.wait()
+        try:
+            return manager._get_status_order_in_moogold(purchase.ext_id_order)
+        except Exception:
+            # сетевые ошибки и битые ответы -- проверим при следующем запуске
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(POLL_WORKERS, len(purchases))) as pool:
+        return list(pool.map(fetch, purchases))
+
+
+def pending_purchases(output_ids: list[int]) -> list[PurchaseCompositeItems]:
+    return list(
+        PurchaseCompositeItems.objects.filter(
+            output_id__in=output_ids, type=PurchaseCompositeItems.MOOGOLD
+        )
+        .exclude(status__in=TERMINAL_STATUSES)
+        .select_related("composite_item")
+    )
+
+
+def apply_statuses(purchases: list, statuses: list) -> int:
+    """Записывает изменившиеся статусы закупок одним bulk_update"""
+    now = timezone.now()
+    changed = []
+    for purchase, status in zip(purchases, statuses):
+        if status not in KNOWN_STATUSES or status == purchase.status:
+            continue
+        if status == purchase.COMPLETED and purchase.composite_item:
+            counters.incr(
+                counters.TOTAL_CRYSTAL,
+                purchase.composite_item.crystals_quantity or 0,
+            )
+        purchase.status = status
+        purchase.updated_at = now
+        changed.append(purchase)
+    PurchaseCompositeItems.objects.bulk_update(changed, ["status", "updated_at"])
+    return len(changed)
+
+
+def complete_outputs(output_ids: list[int]) -> int:
+    """Закрывает выводы, у которых все закупки завершены"""
+    outputs = (
+        Output.objects.filter(id__in=output_ids, active=True)
+        .annotate(
+            purchases=Count("purchase_ci_outputs"),
+            completed=Count(
+                "purchase_ci_outputs",
+                filter=Q(purchase_ci_outputs__status=PurchaseCompositeItems.COMPLETED),
+            ),
+        )
+        .filter(purchases__gt=0, completed=F("purchases"))
+    )
+    count = 0
+    for output in outputs:
+        output.status = output.COMPLETED
+        output.active = False
+        if output.cost_rub is None:
+            output.snapshot_cost(save=False)
+        output.save()
+        count += 1
+    return count
+
+
+def track(manager) -> dict[str, int]:
+    """Один проход по активным выводам"""
+    output_ids = list(
+        Output.objects.filter(active=True).order_by("id").values_list("id", flat=True)
+    )
+    stats = {"outputs": len(output_ids), "changed": 0, "completed": 0}
+    for start in range(0, len(output_ids), BATCH_SIZE):
+        batch = output_ids[start : start + BATCH_SIZE]
+        purchases = pending_purchases(batch)
+        # HTTP-запросы идут вне транзакции
+        statuses = fetch_statuses(manager, purchases)
+        with transaction.atomic():
+            stats["changed"] += apply_statuses(purchases, statuses)
+            stats["completed"] += complete_outputs(batch)
+    return stats
@@ -1,3 +1,252 @@
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+
+from gateways.lava_api import LavaApi
+from payments import lava_poller, moogold_tracker
+from payments.models import Calc, Output, PaymentOrder, PurchaseCompositeItems
+from users.models import UserProfile
+
+
+class CalcBalanceTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="player")
+
+    def balances(self, user=None):
+        return tuple(
+            UserProfile.objects.filter(user=user or self.user).values_list(
+                "real_balance", "demo_balance"
+            )[0]
+        )
+
+    def test_new_calc_changes_balance(self):
+        Calc.objects.create(user=self.user, balance=100)
+        Calc.objects.create(user=self.user, balance=-30)
+        Calc.objects.create(user=self.user, balance=7, demo=True)
+
+        self.assertEqual(self.balances(), (70, 7))
+
+    def test_edit_applies_difference(self):
+        calc = Calc.objects.create(user=self.user, balance=100)
+
+        calc.balance = 40
+        calc.save()
+        self.assertEqual(self.balances(), (40, 0))
+
+        calc.demo = True
+        calc.save()
+        self.assertEqual(self.balances(), (0, 40))
+
+        other = User.objects.create(username="other")
+        calc.user = other
+        calc.save()
+        self.assertEqual(self.balances(), (0, 0))
+        self.assertEqual(self.balances(other), (0, 40))
+
+    def test_save_without_changes_keeps_balance(self):
+        calc = Calc.objects.create(user=self.user, balance=100)
+
+        calc.comment = "Исправлен комментарий"
+        calc.save()
+
+        self.assertEqual(self.balances(), (100, 0))
+
+    def test_delete_reverses_balance(self):
+        Calc.objects.create(user=self.user, balance=100)
+        calc = Calc.objects.create(user=self.user, balance=25)
+
+        calc.delete()
+        self.assertEqual(self.balances(), (100, 0))
+
+        Calc.objects.create(user=self.user, balance=5, demo=True)
+        Calc.objects.filter(user=self.user).delete()
+        self.assertEqual(self.balances(), (0, 0))
+
+
+class FakeLavaServer:
+    """Локальный сервер статусов LAVA, статусы задаются по invoiceId"""
+
+    def __init__(self):
+        self.statuses = {}
+        self.requests = []
+        statuses, requests = self.statuses, self.requests
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                data = json.loads(body)
+                requests.append(data)
+                status = statuses.get(data["invoiceId"])
+                if status is None:
+                    payload = {"status": 404, "error": "Invoice not found"}
+                else:
+                    payload = {"status": 200, "data": {"status": status}}
+                content = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LavaPollerTest(TestCase):
+    def setUp(self):
+        self.server = FakeLavaServer()
+        self.lava = LavaApi(url=self.server.url)
+        self.user = User.objects.create(username="payer")
+        # интервалы между проверками проверяются отдельно
+        patcher = mock.patch.object(
+            lava_poller, "due_orders", side_effect=lambda orders: orders
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.close)
+
+    def create_order(self, status=None, **kwargs):
+        kwargs.setdefault("lava_expired", timezone.now() + datetime.timedelta(hours=1))
+        order = PaymentOrder.objects.create(
+            user=self.user,
+            sum=100,
+            type_payments=PaymentOrder.LAVA,
+            lava_id=f"invoice-{PaymentOrder.objects.count()}",
+            **kwargs,
+        )
+        if status:
+            self.server.statuses[order.lava_id] = status
+        return order
+
+    def test_poll_credits_paid_orders(self):
+        paid = [self.create_order(PaymentOrder.SUCCESS) for _ in range(20)]
+        cancelled = self.create_order(PaymentOrder.EXPIRED)
+        pending = self.create_order(PaymentOrder.CREATE)
+        unknown = self.create_order()
+
+        stats = lava_poller.poll(self.lava)
+
+        self.assertEqual(stats, {"checked": 23, "paid": 20, "expired": 1})
+        self.assertEqual(len(self.server.requests), 23)
+        self.assertEqual(Calc.objects.filter(order__in=paid).count(), 20)
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, PaymentOrder.EXPIRED)
+        self.assertFalse(cancelled.active)
+        for order in (pending, unknown):
+            order.refresh_from_db()
+            self.assertTrue(order.active)
+
+    def test_poll_checks_lapsed_invoices_once_more(self):
+        lapsed = timezone.now() - 2 * lava_poller.EXPIRED_GRACE
+        paid = self.create_order(PaymentOrder.SUCCESS, lava_expired=lapsed)
+        unpaid = self.create_order(PaymentOrder.CREATE, lava_expired=lapsed)
+        unknown = self.create_order(lava_expired=lapsed)
+
+        stats = lava_poller.poll(self.lava)
+
+        self.assertEqual(stats, {"checked": 3, "paid": 1, "expired": 2})
+        self.assertTrue(Calc.objects.filter(order=paid).exists())
+        for order in (unpaid, unknown):
+            order.refresh_from_db()
+            self.assertEqual(order.status, PaymentOrder.EXPIRED)
+            self.assertFalse(order.active)
+
+        lava_poller.poll(self.lava)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_poll_keeps_lapsed_invoice_when_lava_is_down(self):
+        order = self.create_order(
+            lava_expired=timezone.now() - 2 * lava_poller.EXPIRED_GRACE
+        )
+        self.server.close()
+
+        stats = lava_poller.poll(self.lava)
+
+        self.assertEqual(stats["expired"], 0)
+        order.refresh_from_db()
+        self.assertTrue(order.active)
+
+    def test_poll_does_not_credit_twice(self):
+        order = self.create_order(PaymentOrder.SUCCESS)
+
+        lava_poller.poll(self.lava)
+        lava_poller.poll(self.lava)
+
+        self.assertEqual(Calc.objects.filter(order=order).count(), 1)
+
+    def test_check_interval_grows_with_age(self):
+        now = timezone.now()
+        order = PaymentOrder(created_at=now)
+        intervals = []
+        for age in (0, 30, 120, 24 * 60):
+            order.created_at = now - datetime.timedelta(minutes=age)
+            intervals.append(lava_poller.check_interval(order, now))
+        self.assertEqual(intervals, sorted(intervals))
+        self.assertEqual(intervals[0], 0)
+        self.assertEqual(intervals[-1], lava_poller.MAX_INTERVAL)
+
+
+class FakeMoogoldManager:
+    def __init__(self, statuses: dict):
+        self.statuses = statuses
+        self.requested = []
+
+    def _get_status_order_in_moogold(self, order_id):
+        self.requested.append(order_id)
+        return self.statuses[order_id]
+
+
+class MoogoldTrackerTest(TestCase):
+    def setUp(self):
+        self.output = Output.objects.create(cost_rub=10)
+
+    def create_purchase(self, ext_id, status=PurchaseCompositeItems.PROCCESS):
+        return PurchaseCompositeItems.objects.create(
+            output=self.output, ext_id_order=ext_id, status=status
+        )
+
+    def test_completes_output_when_all_purchases_completed(self):
+        self.create_purchase("1")
+        self.create_purchase("2", PurchaseCompositeItems.COMPLETED)
+        manager = FakeMoogoldManager({"1": PurchaseCompositeItems.COMPLETED})
+
+        stats = moogold_tracker.track(manager)
+
+        self.assertEqual(manager.requested, ["1"])
+        self.assertEqual(stats, {"outputs": 1, "changed": 1, "completed": 1})
+        self.output.refresh_from_db()
+        self.assertEqual(self.output.status, Output.COMPLETED)
+        self.assertFalse(self.output.active)
+
+    def test_keeps_output_active_until_purchases_complete(self):
+        self.create_purchase("1")
+        self.create_purchase("2")
+        manager = FakeMoogoldManager(
+            {
+                "1": PurchaseCompositeItems.COMPLETED,
+                "2": PurchaseCompositeItems.RESTOCK,
+            }
+        )
+
+        moogold_tracker.track(manager)
+        manager.statuses["2"] = PurchaseCompositeItems.RESTOCK
+        stats = moogold_tracker.track(manager)
 
-# Create your tests here.
+        self.assertCountEqual(manager.requested, ["1", "2", "2"])
+        self.assertEqual(stats["changed"], 0)
+        self.output.refresh_from_db()
+        self.assertTrue(self.output.active)
@@ -18,12 +18,19 @@ def create_ref_link(sender, instance, **kwargs):
             RefLinks.objects.create(from_user=instance.profile)
 
 
+def mark_profile_stats_dirty(sender, instance, **kwargs):
+    from users import profile_stats
+
+    profile_stats.mark_dirty(instance.user_id)
+
+
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
 
     def ready(self):
         from django.contrib.auth.models import User
+        from payments.models import Calc, Output, PaymentOrder
 
         post_save.connect(
             create_user_profile,
@@ -34,3 +41,8 @@ class UsersConfig(AppConfig):
             create_user_profile,
             sender=User,
         )
+
+        # открытие кейса всегда пишет Calc, отдельный сигнал для него не нужен
+        post_save.connect(mark_profile_stats_dirty, sender=Calc)
+        post_save.connect(mark_profile_stats_dirty, sender=PaymentOrder)
+        post_save.connect(mark_profile_stats_dirty, sender=Output)
@@ -1,14 +1,37 @@
+import asyncio
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from users import presence
+from utils.redis_client import get_async_redis
+
 
 class OnlineUsersConsumer(AsyncWebsocketConsumer):
+    """Подключение считается онлайн, пока раз в HEARTBEAT_INTERVAL
+    обновляет отметку в presence, любое сообщение клиента тоже её обновляет
+    """
+
     async def connect(self):
         self.group_name = "online_users"
+        self.member = presence.member_for(self.scope.get("user"), self.channel_name)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        await presence.join(get_async_redis(), self.member)
+        self.heartbeat = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(presence.HEARTBEAT_INTERVAL)
+            await presence.touch(get_async_redis(), self.member)
 
     async def disconnect(self, close_code):
+        heartbeat = getattr(self, "heartbeat", None)
+        if heartbeat:
+            heartbeat.cancel()
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, "member"):
+            await presence.leave(get_async_redis(), self.member)
 
     async def receive(self, text_data):
+        await presence.touch(get_async_redis(), self.member)
         await self.send(text_data)
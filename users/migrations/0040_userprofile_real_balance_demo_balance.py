@@ -0,0 +1,41 @@
+# Generated by Django 4.2.9 on 2026-10-18 10:22
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_balances(apps, schema_editor):
+    UserProfile = apps.get_model("users", "UserProfile")
+    Calc = apps.get_model("payments", "Calc")
+
+    for demo, field in ((False, "real_balance"), (True, "demo_balance")):
+        ledger = (
+            Calc.objects.filter(user_id=OuterRef("user_id"), demo=demo)
+            .values("user_id")
+            .annotate(total=Sum("balance"))
+            .values("total")
+        )
+        UserProfile.objects.update(**{field: Coalesce(Subquery(ledger), Value(0.0))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0039_alter_contestswinners_user"),
+        ("payments", "0055_alter_output_comment_alter_output_output_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="demo_balance",
+            field=models.FloatField(default=0, verbose_name="Демо баланс"),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="real_balance",
+            field=models.FloatField(default=0, verbose_name="Баланс"),
+        ),
+        migrations.RunPython(fill_balances, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from random import choices
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.functional import cached_property
 
@@ -48,6 +49,9 @@ class UserProfile(models.Model):
         db_index=True,
     )
 
+    real_balance = models.FloatField(verbose_name="Баланс", default=0)
+    demo_balance = models.FloatField(verbose_name="Демо баланс", default=0)
+
     balance_save = models.FloatField(verbose_name="Сохранённый баланс", default=0)
     winrate_save = models.FloatField(
         verbose_name="Сохранённый процент побед", default=0
@@ -55,6 +59,19 @@ class UserProfile(models.Model):
     debit_save = models.FloatField(verbose_name="Сохранённый депозит", default=0)
     output_save = models.FloatField(verbose_name="Сохранённый вывод", default=0)
 
+    BALANCE_FIELDS = ("real_balance", "demo_balance")
+
+    def save(self, *args, **kwargs):
+        # баланс меняется только начислениями, обычное сохранение профиля
+        # не должно перезаписывать его устаревшим значением
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.BALANCE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def verify(self):
         self.verified = True
         self.save()
@@ -68,8 +85,13 @@ class UserProfile(models.Model):
         winrate = win / all_opened
         return winrate
 
-    @cached_property
+    @property
     def balance(self) -> float:
+        balance = self.demo_balance if self.demo else self.real_balance
+        return round(balance, 2)
+
+    def ledger_balance(self) -> float:
+        """Баланс по журналу начислений, используется для сверки"""
         balance = self.user.calc.filter(demo=self.demo).aggregate(
             models.Sum("balance")
         )["balance__sum"]
@@ -77,6 +99,23 @@ class UserProfile(models.Model):
             return 0
         return round(balance, 2)
 
+    @staticmethod
+    def balance_field(demo: bool) -> str:
+        return "demo_balance" if demo else "real_balance"
+
+    @classmethod
+    def apply_balance(cls, user_id: int, amount: float, demo: bool):
+        """Атомарно изменяет сохранённый баланс на сумму начисления"""
+        field = cls.balance_field(demo)
+        cls.objects.filter(user_id=user_id).update(**{field: models.F(field) + amount})
+
+    @classmethod
+    def lock(cls, user: User) -> "UserProfile":
+        """Блокирует профиль пользователя до конца текущей транзакции.
+        Проверка баланса и списание должны идти под этой блокировкой
+        """
+        return cls.objects.select_for_update().get(user=user)
+
     @cached_property
     def total_income(self) -> float:
         links = self.ref_links.filter(active=True, removed=False)
@@ -185,6 +224,24 @@ class UserItems(models.Model):
         related_name="output_items",
     )
 
+    @classmethod
+    def with_sale_price(cls, queryset):
+        """Предметы с ценой продажи и общей стоимостью выборки одним запросом.
+
+        Цена берётся из sale_price, а если она не задана -- из сохранённой
+        закупочной цены, без пересчёта через курс и составные предметы.
+        total_price считается оконной функцией по всей выборке до LIMIT.
+        """
+        price = models.Case(
+            models.When(item__sale_price=0, then="item__purchase_price_cached"),
+            default="item__sale_price",
+            output_field=models.FloatField(),
+        )
+        return queryset.select_related("item", "item__rarity_category").annotate(
+            sale_price_value=Coalesce(price, 0.0),
+            total_price=models.Window(models.Sum(Coalesce(price, 0.0))),
+        )
+
     def sale_item(self):
         from payments.models import Calc
 
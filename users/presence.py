@@ -0,0 +1,59 @@
+"""Пользователи онлайн.
+
+Каждое подключение к ws/online раз в HEARTBEAT_INTERVAL обновляет время
+последней активности в sorted set PRESENCE_KEY. Авторизованный пользователь
+записывается один раз независимо от числа вкладок, гость -- по каналу.
+Открытые вкладки пользователя считаются в хэше CONNECTIONS_KEY, из набора он
+удаляется только при закрытии последней. Участники, от которых не было
+сигнала дольше PRESENCE_TTL, удаляются ZREMRANGEBYSCORE, число онлайн --
+ZCARD.
+"""
+
+import time
+
+from utils.redis_client import get_redis
+
+PRESENCE_KEY = "presence:online"
+CONNECTIONS_KEY = "presence:connections"
+HEARTBEAT_INTERVAL = 30
+# запас на пропущенный сигнал, после него участник считается ушедшим
+PRESENCE_TTL = 3 * HEARTBEAT_INTERVAL
+
+
+def member_for(user, channel_name: str) -> str:
+    if user is not None and user.is_authenticated:
+        return f"user:{user.id}"
+    return f"channel:{channel_name}"
+
+
+async def touch(client, member: str):
+    """Отмечает участника активным"""
+    await client.zadd(PRESENCE_KEY, {member: time.time()})
+
+
+def _is_user(member: str) -> bool:
+    return member.startswith("user:")
+
+
+async def join(client, member: str):
+    if _is_user(member):
+        await client.hincrby(CONNECTIONS_KEY, member, 1)
+    await touch(client, member)
+
+
+async def leave(client, member: str):
+    if _is_user(member):
+        left = await client.hincrby(CONNECTIONS_KEY, member, -1)
+        if left > 0:
+            # остались другие вкладки
+            return
+        await client.hdel(CONNECTIONS_KEY, member)
+    await client.zrem(PRESENCE_KEY, member)
+
+
+def count_online(client=None) -> int:
+    """Число участников онлайн без устаревших"""
+    pipe = (client or get_redis()).pipeline(transaction=False)
+    pipe.zremrangebyscore(PRESENCE_KEY, "-inf", time.time() - PRESENCE_TTL)
+    pipe.zcard(PRESENCE_KEY)
+    return pipe.execute()[-1]
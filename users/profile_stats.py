@@ -0,0 +1,118 @@
+"""Сохранённые показатели профиля: balance_save, winrate_save, debit_save,
+output_save.
+
+Начисления, пополнения и выводы пользователя помечают его в множестве
+DIRTY_USERS_KEY, открытие кейса тоже пишет начисление. Задача
+save_profile_data забирает помеченных пачками и обновляет показатели
+одним UPDATE на пачку, значения считаются подзапросами с GROUP BY user_id.
+"""
+
+import redis
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+from utils.redis_client import get_redis
+
+DIRTY_USERS_KEY = "profile_stats:dirty"
+BATCH_SIZE = 1000
+
+
+def mark_dirty(user_id: int):
+    """Помечает пользователя для пересчёта после коммита транзакции"""
+    if not user_id:
+        return
+
+    def send():
+        try:
+            get_redis().sadd(DIRTY_USERS_KEY, user_id)
+        except redis.RedisError:
+            # пользователь пересчитается при полном обновлении
+            pass
+
+    transaction.on_commit(send)
+
+
+def _per_user(queryset, aggregate):
+    return Subquery(
+        queryset.filter(user_id=OuterRef("user_id"))
+        .order_by()
+        .values("user_id")
+        .annotate(value=aggregate)
+        .values("value")
+    )
+
+
+def refresh(user_ids) -> int:
+    """Пересчитывает показатели активных пользователей из user_ids"""
+    from cases.models import OpenedCases
+    from payments.models import Output, PaymentOrder
+    from users.models import UserProfile
+
+    opened = _per_user(OpenedCases.objects.all(), Count("id"))
+    won = _per_user(OpenedCases.objects.all(), Count("id", filter=Q(win=True)))
+    debit = _per_user(
+        PaymentOrder.objects.filter(
+            status__in=(PaymentOrder.SUCCESS, PaymentOrder.APPROVAL)
+        ),
+        Sum("sum"),
+    )
+    output = _per_user(
+        Output.objects.filter(active=False, status=Output.COMPLETED),
+        Sum("withdrawal_price"),
+    )
+    return UserProfile.objects.filter(
+        user_id__in=user_ids, user__is_active=True
+    ).update(
+        balance_save=Round(
+            Case(When(demo=True, then=F("demo_balance")), default=F("real_balance")),
+            2,
+        ),
+        winrate_save=Coalesce(
+            Cast(won, FloatField()) / NullIf(Cast(opened, FloatField()), 0.0),
+            Value(0.0),
+        ),
+        debit_save=Coalesce(Cast(debit, FloatField()), Value(0.0)),
+        output_save=Coalesce(Cast(output, FloatField()), Value(0.0)),
+    )
+
+
+def refresh_dirty(batch_size: int = BATCH_SIZE) -> int:
+    """Пересчитывает всех помеченных пользователей пачками"""
+    client = get_redis()
+    updated = 0
+    while True:
+        user_ids = client.spop(DIRTY_USERS_KEY, batch_size)
+        if not user_ids:
+            return updated
+        try:
+            updated += refresh([int(user_id) for user_id in user_ids])
+        except Exception:
+            client.sadd(DIRTY_USERS_KEY, *user_ids)
+            raise
+
+
+def refresh_all(batch_size: int = BATCH_SIZE) -> int:
+    from users.models import UserProfile
+
+    user_ids = UserProfile.objects.order_by("user_id").values_list("user_id", flat=True)
+    updated, batch = 0, []
+    for user_id in user_ids.iterator(chunk_size=batch_size):
+        batch.append(user_id)
+        if len(batch) >= batch_size:
+            updated += refresh(batch)
+            batch = []
+    if batch:
+        updated += refresh(batch)
+    return updated
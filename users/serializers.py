@@ -219,6 +219,8 @@ class UserItemSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_price(instance) -> float:
+        if hasattr(instance, "sale_price_value"):
+            return instance.sale_price_value
         if instance.item.sale_price != 0:
             sale_price = instance.item.sale_price
         else:
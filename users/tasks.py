@@ -1,20 +1,27 @@
 from celery import shared_task
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce
 from django.utils import timezone
 
+from payments.models import Calc
+from users import profile_stats
 from users.models import UserVerify, UserProfile
 from utils.decorators import single_task
 
 
 @shared_task
-@single_task(None)
-def save_profile_data():
-    profiles = UserProfile.objects.filter(user__is_active=True)
-    for profile in profiles:
-        profile.balance_save = profile.balance
-        profile.winrate_save = profile.winrate
-        profile.debit_save = profile.all_debit()
-        profile.output_save = profile.all_output()
-        profile.save()
+@single_task(30 * 60)
+def save_profile_data(full: bool = False):
+    """Обновление сохранённых показателей профилей.
+    По умолчанию только у пользователей с изменениями с прошлого запуска,
+    с full=True -- у всех
+    """
+    if full:
+        updated = profile_stats.refresh_all()
+    else:
+        updated = profile_stats.refresh_dirty()
+    return f"Обновлены показатели профилей: {updated}"
 
 
 @shared_task
@@ -29,3 +36,39 @@ def deactive_user_verified():
         if v.to_date <= time:
             v.active = False
             v.save()
+
+
+@shared_task
+@single_task(60 * 30)
+def reconcile_profile_balances():
+    """Сверка сохранённого баланса с журналом начислений.
+    Расхождения исправляются под блокировкой профиля
+    """
+    fixed = 0
+    for demo in (False, True):
+        field = UserProfile.balance_field(demo)
+        ledger = (
+            Calc.objects.filter(user_id=OuterRef("user_id"), demo=demo)
+            .values("user_id")
+            .annotate(total=Sum("balance"))
+            .values("total")
+        )
+        user_ids = (
+            UserProfile.objects.annotate(ledger=Coalesce(Subquery(ledger), Value(0.0)))
+            .annotate(diff=Abs(F(field) - F("ledger")))
+            .filter(diff__gt=0.01)
+            .values_list("user_id", flat=True)
+        )
+        for user_id in user_ids:
+            with transaction.atomic():
+                profile = UserProfile.objects.select_for_update().get(user_id=user_id)
+                total = Calc.objects.filter(user_id=user_id, demo=demo).aggregate(
+                    total=Sum("balance")
+                )["total"]
+                setattr(profile, field, total or 0)
+                profile.save(update_fields=[field])
+            fixed += 1
+
+    if not fixed:
+        return "Расхождений баланса нет"
+    return f"Исправлено расхождений баланса: {fixed}"
@@ -1,8 +1,47 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
+from cases.models import Case, Item, OpenedCases
+from payments.models import Calc
+from users.models import UserProfile
+
 
 class TestUserAuth(TestCase):
     API_USER = {"username": "API_USER", "password": "API_USER"}
 
     def setUp(self) -> None:
         pass
+
+
+class ProfileBalanceTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="player")
+        Calc.objects.create(user=self.user, balance=100)
+        Calc.objects.create(user=self.user, balance=7, demo=True)
+
+    def test_profile_save_keeps_balances(self):
+        profile = UserProfile.objects.get(user=self.user)
+        Calc.objects.create(user=self.user, balance=50)
+
+        # в памяти баланс устарел, сохранение не должно его вернуть
+        profile.locale = "en"
+        profile.save()
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.locale, "en")
+        self.assertEqual((profile.real_balance, profile.demo_balance), (150, 7))
+
+    def test_open_cases_checks_locked_balance(self):
+        items = [
+            Item.objects.create(name=f"item {i}", price=i, purchase_price_cached=i * 10)
+            for i in range(1, 4)
+        ]
+        case = Case.objects.create(name="case", price=60)
+        case.items.set(items)
+        user = User.objects.select_related("profile").get(pk=self.user.pk)
+        # профиль в памяти ещё видит 100 на балансе
+        Calc.objects.create(user=self.user, balance=-50)
+
+        self.assertEqual(case.open_cases(user, 1), [])
+        self.assertFalse(OpenedCases.objects.filter(user=self.user).exists())
+        self.assertEqual(UserProfile.objects.get(user=self.user).real_balance, 50)
@@ -4,6 +4,7 @@ import hmac
 import hashlib
 
 from django.contrib.auth import authenticate, login, REDIRECT_FIELD_NAME
+from django.db import transaction
 from django.db.models import Sum
 from django.urls import reverse
 from django.conf import settings
@@ -288,11 +289,18 @@ class UserItemsListView(ModelViewSet):
         return UserItemSerializer
 
     def list(self, request, *args, **kwargs):
-        items = self.paginate_queryset(
+        queryset = UserItems.with_sale_price(
             self.get_queryset().filter(active=True, user=request.user)
         )
+        items = self.paginate_queryset(queryset)
         serializer = self.get_serializer(items, many=True)
         response = self.get_paginated_response(serializer.data)
+        if items:
+            total_price = items[0].total_price
+        else:
+            # страница за пределами выборки, окно не вернуло ни одной строки
+            total_price = queryset.aggregate(total=Sum("sale_price_value"))["total"]
+        response.data["total_price"] = round(total_price or 0, 2)
         return response
 
     @extend_schema(request=None)
@@ -347,7 +355,7 @@ class UserItemsListView(ModelViewSet):
         if not user:
             return Response({"message": "Пользователь не найден"}, status=404)
 
-        queryset = self.get_queryset().filter(user=user)
+        queryset = UserItems.with_sale_price(self.get_queryset().filter(user=user))
         items = self.paginate_queryset(queryset)
 
         serializer = self.get_serializer(items, many=True)
@@ -379,8 +387,10 @@ class UpgradeItem(GenericViewSet):
     @action(detail=False, methods=("get",), pagination_class=LimitOffsetPagination)
     def user_items(self, request, *args, **kwargs):
         items = self.paginate_queryset(
-            self.get_queryset().filter(
-                withdrawal_process=False, active=True, user=request.user
+            UserItems.with_sale_price(
+                self.get_queryset().filter(
+                    withdrawal_process=False, active=True, user=request.user
+                )
             )
         )
         serializer = self.get_serializer(items, many=True)
@@ -458,29 +468,36 @@ class UpgradeItem(GenericViewSet):
             return Response({"message": message}, status=status.HTTP_400_BAD_REQUEST)
 
         if "balance" in data:
-            _status, item = UserItems.upgrade_item(
-                user=request.user,
-                balance=data["balance"],
-                upgraded=data["upgraded_item"],
-            )
-            history = UserUpgradeHistory.objects.create(
-                user=request.user,
-                balance=data["balance"],
-            )
-            history.desired.add(data["upgraded_item"])
-            Calc.objects.create(
-                balance=-data["balance"],
-                user=request.user,
-                comment="Апгрейд",
-                demo=request.user.profile.demo,
-            )
-            if not _status:
-                if item == "Проигрыш":
-                    return Response(status=status.HTTP_204_NO_CONTENT)
-                return Response(status=status.HTTP_400_BAD_REQUEST)
-            history.success = True
-            history.save()
-            UserItems.objects.create(item=item, user=request.user)
+            with transaction.atomic():
+                profile = UserProfile.lock(request.user)
+                if data["balance"] > profile.balance:
+                    return Response(
+                        {"message": "Недостаточно средств"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                _status, item = UserItems.upgrade_item(
+                    user=request.user,
+                    balance=data["balance"],
+                    upgraded=data["upgraded_item"],
+                )
+                history = UserUpgradeHistory.objects.create(
+                    user=request.user,
+                    balance=data["balance"],
+                )
+                history.desired.add(data["upgraded_item"])
+                Calc.objects.create(
+                    balance=-data["balance"],
+                    user=request.user,
+                    comment="Апгрейд",
+                    demo=request.user.profile.demo,
+                )
+                if not _status:
+                    if item == "Проигрыш":
+                        return Response(status=status.HTTP_204_NO_CONTENT)
+                    return Response(status=status.HTTP_400_BAD_REQUEST)
+                history.success = True
+                history.save()
+                UserItems.objects.create(item=item, user=request.user)
             return Response(ItemListSerializer(item).data)
         else:
             _status, item = UserItems.upgrade_item(
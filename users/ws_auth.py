@@ -0,0 +1,47 @@
+"""Авторизация websocket-подключений по JWT.
+
+API авторизует клиентов access-токеном simplejwt, поэтому для websocket
+токен принимается из параметра ?token= или заголовка Authorization: Bearer.
+Без токена или с неверным токеном остаётся пользователь из сессии, который
+проставляет AuthMiddlewareStack.
+"""
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+
+
+def _raw_token(scope) -> str | None:
+    query = parse_qs(scope.get("query_string", b"").decode())
+    if query.get("token"):
+        return query["token"][0]
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0].lower() == "bearer":
+                return parts[1]
+    return None
+
+
+@database_sync_to_async
+def _get_user(raw_token: str):
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import TokenError
+
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (TokenError, AuthenticationFailed):
+        return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        raw_token = _raw_token(scope)
+        if raw_token:
+            user = await _get_user(raw_token)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
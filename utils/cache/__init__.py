@@ -0,0 +1,2 @@
+from utils.cache.app_cache import AppCache, get_app_cache
+from utils.cache.stats import get_stats, reset_stats
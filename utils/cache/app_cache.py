@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from utils.cache.stats import record
+
+NAMESPACE_VERSION_KEY = "namespace_version:{namespace}"
+# как долго процесс доверяет своей копии версии пространства имён, в секундах
+NAMESPACE_VERSION_TTL = 1
+
+_missing = object()
+
+
+class LocalCache:
+    """Маленький LRU-кэш в памяти процесса с временем жизни записей"""
+
+    def __init__(self, ttl: float, size: int):
+        self.ttl = ttl
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_missing):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class AppCache:
+    """Кэш отдельного приложения поверх общего Redis.
+
+    Ключи получают префикс пространства имён и его версию, поэтому
+    invalidate() сбрасывает все ключи пространства одним INCR. При local_ttl
+    значения дополнительно держатся в памяти процесса, другие процессы видят
+    изменения с задержкой не больше local_ttl.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        local_ttl: float = 0,
+        local_size: int = 256,
+        alias: str = "default",
+    ):
+        self.namespace = namespace
+        self.alias = alias
+        self.local = LocalCache(local_ttl, local_size) if local_ttl else None
+        self._version = None
+        self._version_checked_at = 0.0
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self) -> str:
+        return NAMESPACE_VERSION_KEY.format(namespace=self.namespace)
+
+    @property
+    def version(self) -> int:
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at > (
+            NAMESPACE_VERSION_TTL
+        ):
+            version = self.backend.get(self.version_key)
+            if version is None:
+                self.backend.add(self.version_key, 1, None)
+                version = self.backend.get(self.version_key) or 1
+            if version != self._version and self.local:
+                self.local.clear()
+            self._version = version
+            self._version_checked_at = now
+        return self._version
+
+    def make_key(self, key: str) -> str:
+        return f"{self.namespace}:{self.version}:{key}"
+
+    def get(self, key: str, default=None):
+        full_key = self.make_key(key)
+        if self.local:
+            value = self.local.get(full_key)
+            if value is not _missing:
+                record(self.namespace, "l1_hit")
+                return value
+
+        value = self.backend.get(full_key, _missing)
+        if value is _missing:
+            record(self.namespace, "miss")
+            return default
+        record(self.namespace, "hit")
+        if self.local:
+            self.local.set(full_key, value)
+        return value
+
+    def get_many(self, keys: list[str]) -> dict:
+        full_keys = {self.make_key(key): key for key in keys}
+        result = {}
+        if self.local:
+            for full_key, key in list(full_keys.items()):
+                value = self.local.get(full_key)
+                if value is not _missing:
+                    result[key] = value
+                    del full_keys[full_key]
+            record(self.namespace, "l1_hit", len(result))
+
+        if full_keys:
+            values = self.backend.get_many(list(full_keys))
+            record(self.namespace, "hit", len(values))
+            record(self.namespace, "miss", len(full_keys) - len(values))
+            for full_key, value in values.items():
+                result[full_keys[full_key]] = value
+                if self.local:
+                    self.local.set(full_key, value)
+        return result
+
+    def set(self, key: str, value, timeout=DEFAULT_TIMEOUT):
+        full_key = self.make_key(key)
+        self.backend.set(full_key, value, timeout)
+        if self.local and timeout != 0:
+            local_ttl = timeout if isinstance(timeout, (int, float)) else None
+            self.local.set(full_key, value, local_ttl)
+
+    def add(self, key: str, value, timeout=DEFAULT_TIMEOUT) -> bool:
+        return self.backend.add(self.make_key(key), value, timeout)
+
+    def delete(self, key: str):
+        full_key = self.make_key(key)
+        self.backend.delete(full_key)
+        if self.local:
+            self.local.delete(full_key)
+
+    def get_or_set(self, key: str, default, timeout=DEFAULT_TIMEOUT):
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout)
+        return value
+
+    def invalidate(self):
+        """Сбрасывает все ключи пространства имён"""
+        try:
+            self._version = self.backend.incr(self.version_key)
+        except ValueError:
+            self.backend.add(self.version_key, 1, None)
+            self._version = self.backend.incr(self.version_key)
+        self._version_checked_at = time.monotonic()
+        if self.local:
+            self.local.clear()
+
+
+_app_caches = {}
+
+
+def get_app_cache(namespace: str, **kwargs) -> AppCache:
+    """Общий экземпляр кэша пространства имён в пределах процесса"""
+    if namespace not in _app_caches:
+        _app_caches[namespace] = AppCache(namespace, **kwargs)
+    return _app_caches[namespace]
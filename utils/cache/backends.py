@@ -0,0 +1,28 @@
+from django.core.cache.backends.redis import RedisCache
+
+from utils.cache.stats import record
+
+_missing = object()
+
+
+class InstrumentedRedisCache(RedisCache):
+    """RedisCache со счётчиками попаданий и промахов"""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self.stats_namespace = params.get("STATS_NAMESPACE", "django")
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            record(self.stats_namespace, "miss")
+            return default
+        record(self.stats_namespace, "hit")
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        record(self.stats_namespace, "hit", len(values))
+        record(self.stats_namespace, "miss", len(keys) - len(values))
+        return values
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import Counter
+
+from utils.redis_client import get_redis
+
+STATS_KEY = "cache_stats"
+# счётчики копятся в памяти процесса и сбрасываются в Redis не чаще раза в
+# FLUSH_INTERVAL секунд, чтобы не добавлять запрос на каждое обращение к кэшу
+FLUSH_INTERVAL = 10
+
+_counters = Counter()
+_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def record(namespace: str, event: str, count: int = 1):
+    """Учитывает событие кэша: hit, miss, l1_hit"""
+    global _flushed_at
+
+    with _lock:
+        _counters[f"{namespace}:{event}"] += count
+        if time.monotonic() - _flushed_at < FLUSH_INTERVAL:
+            return
+        counters = dict(_counters)
+        _counters.clear()
+        _flushed_at = time.monotonic()
+    flush(counters)
+
+
+def flush(counters: dict = None):
+    if counters is None:
+        with _lock:
+            counters = dict(_counters)
+            _counters.clear()
+    if not counters:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for field, value in counters.items():
+            pipe.hincrby(STATS_KEY, field, value)
+        pipe.execute()
+    except Exception:
+        # статистика не должна ломать обращение к кэшу
+        pass
+
+
+def get_stats() -> dict:
+    """Счётчики по пространствам имён с долей попаданий.
+    django -- все обращения к кэшу default, включая пространства имён AppCache
+    """
+    flush()
+    raw = get_redis().hgetall(STATS_KEY)
+    stats = {}
+    for field, value in raw.items():
+        namespace, event = field.decode().rsplit(":", 1)
+        stats.setdefault(namespace, {"hit": 0, "miss": 0, "l1_hit": 0})
+        stats[namespace][event] = int(value)
+    for values in stats.values():
+        total = values["hit"] + values["miss"] + values["l1_hit"]
+        values["hit_rate"] = (
+            round((values["hit"] + values["l1_hit"]) / total, 4) if total else 0
+        )
+    return stats
+
+
+def reset_stats():
+    with _lock:
+        _counters.clear()
+    get_redis().delete(STATS_KEY)
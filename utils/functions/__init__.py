@@ -4,6 +4,10 @@ from utils.functions.generate_upload_name import generate_upload_name
 from utils.functions.transliteration import transliterate
 from utils.functions.output_id_generator import output_id_generator
 from .id_generator import id_generator_X64
-from .combinations import find_combination
+from .combinations import (
+    find_combination,
+    CombinationSolver,
+    get_combination_solver,
+)
 from .output_id_generator import ref_output_id_generator
 from .get_ip_client import get_client_ip
@@ -1,3 +1,15 @@
+import threading
+from collections import OrderedDict
+
+# верхняя граница таблицы решателя, большие цели считаются разовым проходом
+MAX_SOLVER_TARGET = 200_000
+# сколько решателей для разных наборов номиналов держать в памяти
+SOLVERS_CACHE_SIZE = 8
+
+_solvers = OrderedDict()
+_solvers_lock = threading.Lock()
+
+
 def find_combination(target, values) -> list:
     dp = [False] * (target + 1)
     dp[0] = True
@@ -20,3 +32,81 @@ def find_combination(target, values) -> list:
         current_sum -= prev[current_sum]
 
     return combination
+
+
+class CombinationSolver:
+    """Подбор набора номиналов на нужное количество кристаллов.
+
+    costs -- стоимость каждого номинала, {номинал: цена}. Для каждой суммы
+    таблица хранит минимальную стоимость набора и последний номинал в нём,
+    таблица достраивается по мере роста запрошенных целей до max_target.
+    Если точную сумму собрать нельзя, берётся ближайшая меньшая, как в
+    find_combination. Ответ восстанавливается за длину набора.
+    """
+
+    def __init__(self, costs: dict[int, float], max_target: int = MAX_SOLVER_TARGET):
+        self.costs = {value: cost for value, cost in costs.items() if value > 0}
+        self.values = sorted(self.costs)
+        self.max_target = max_target
+        self.best = [0.0]
+        self.prev = [None]
+        # наибольшая собираемая сумма, не превышающая индекс
+        self.closest = [0]
+        self._lock = threading.Lock()
+
+    def _extend(self, target: int):
+        best, prev, closest = self.best, self.prev, self.closest
+        for i in range(len(best), target + 1):
+            best_cost, best_value = None, None
+            for value in self.values:
+                if value > i:
+                    break
+                if prev[i - value] is None and i != value:
+                    continue
+                cost = best[i - value] + self.costs[value]
+                if best_cost is None or cost < best_cost:
+                    best_cost, best_value = cost, value
+            best.append(best_cost)
+            prev.append(best_value)
+            closest.append(i if best_value is not None else closest[i - 1])
+
+    def _solve_once(self, target: int) -> list[int]:
+        solver = CombinationSolver(self.costs, max_target=target)
+        solver._extend(target)
+        return solver._restore(target)
+
+    def _restore(self, target: int) -> list[int]:
+        combination = []
+        current_sum = self.closest[target]
+        while current_sum > 0:
+            combination.append(self.prev[current_sum])
+            current_sum -= self.prev[current_sum]
+        return combination
+
+    def solve(self, target: int) -> list[int]:
+        if not target or target < 0 or not self.values:
+            return []
+        if target > self.max_target:
+            return self._solve_once(target)
+        if target >= len(self.best):
+            with self._lock:
+                self._extend(target)
+        return self._restore(target)
+
+    def cost(self, target: int) -> float:
+        return sum(self.costs[value] for value in self.solve(target))
+
+
+def get_combination_solver(costs: dict[int, float]) -> CombinationSolver:
+    """Решатель для набора номиналов, одинаковые наборы делят одну таблицу"""
+    key = tuple(sorted(costs.items()))
+    with _solvers_lock:
+        solver = _solvers.get(key)
+        if solver is None:
+            solver = CombinationSolver(costs)
+            _solvers[key] = solver
+            if len(_solvers) > SOLVERS_CACHE_SIZE:
+                _solvers.popitem(last=False)
+        else:
+            _solvers.move_to_end(key)
+    return solver
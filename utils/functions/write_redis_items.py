@@ -1,67 +1,171 @@
-from django.conf import settings
-from cases.serializers import ItemListSerializer, CaseLive
-from core.models import GenericSettings
-import redis
-import json
+import logging
+import os
+import queue
 import threading
 import time
 
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from cases.live_tape import LIVE_TAPE_GROUP, write_items
+from core.models import GenericSettings
+from utils.cache import get_app_cache
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
 
-def task(user, items, case):
-    list_key = "live_tape"
-    redis_client = redis.from_url(settings.REDIS_CONNECTION_STRING)
+PUBLISHER_STATS_KEY = "live_tape:publisher_stats"
+# сколько пачек может ждать отправки, всё сверх этого отбрасывается
+PUBLISHER_QUEUE_SIZE = 1000
+# сколько предметов отправляется в Redis за один проход
+PUBLISHER_BATCH_SIZE = 100
 
-    generic = GenericSettings.objects.first()
 
-    new_items = []
+def _media_url(domain_url: str, file) -> str | None:
+    if not file:
+        return None
+    return f"https://{domain_url}{file.url}"
 
-    for i in items:
-        item = ItemListSerializer(i[0]).data
-        item.update(
+
+def build_entries(user, items, case, domain_url: str) -> list[dict]:
+    """Записи ленты из уже загруженных объектов, без сериализаторов и запросов"""
+    profile = user.profile
+    user_data = {
+        "id": profile.id,
+        "image": f"https://{domain_url}/media/{profile.image}",
+        "username": user.username,
+    }
+    open_case = None
+    if case:
+        open_case = {
+            "name": case.name,
+            "translit_name": case.translit_name,
+            "image": _media_url(domain_url, case.image),
+        }
+
+    entries = []
+    timestamp = time.time()
+    for item, user_item in items:
+        rarity = item.rarity_category
+        entries.append(
             {
-                "image": (
-                    "https://" + generic.domain_url + item.get("image")
-                    if item.get("image", False)
+                "item_id": item.item_id,
+                "name": item.name,
+                "price": item.price,
+                "image": _media_url(domain_url, item.image),
+                "rarity_category": (
+                    {
+                        "rarity_id": rarity.rarity_id,
+                        "name": rarity.name,
+                        "rarity_color": rarity.rarity_color,
+                    }
+                    if rarity
                     else None
-                )
+                ),
+                "user_item_id": user_item.id,
+                "user": user_data,
+                "open_case": open_case,
+                "timestamp": timestamp,
             }
         )
-        item.update({"user_item_id": i[1].id})
-        item.update(
-            {
-                "user": {
-                    "id": user.profile.id,
-                    "image": "https://"
-                    + generic.domain_url
-                    + "/media/"
-                    + str(user.profile.image),
-                    "username": user.username,
-                }
-            }
-        )
-        if case:
-
-            open_case = CaseLive(case).data
-            open_case.update(
-                {
-                    "image": (
-                        "https://" + generic.domain_url + open_case.get("image")
-                        if open_case.get("image", False)
-                        else None
-                    )
-                }
+    return entries
+
+
+class LiveTapePublisher:
+    """Фоновая отправка предметов в лайв ленту.
+
+    Запросы кладут готовые записи в ограниченную очередь, один поток
+    процесса забирает их пачками и пишет в Redis одним pipeline с рассылкой
+    по группе. Если очередь заполнена, записи отбрасываются и учитываются
+    в счётчике dropped, ленту не ждёт ни один запрос.
+    """
+
+    def __init__(self, maxsize: int = PUBLISHER_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.published = 0
+        self.dropped = 0
+        self.errors = 0
+        self._reported_dropped = 0
+        self._worker = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # после fork поток воркера не наследуется, запускаем заново
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._pid = os.getpid()
+            self._worker = threading.Thread(
+                target=self._run, name="live-tape-publisher", daemon=True
             )
-            item.update({"open_case": open_case})
-        else:
-            item.update({"open_case": None})
+            self._worker.start()
+
+    def publish(self, entries: list[dict]) -> bool:
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(entries)
+        except queue.Full:
+            self.dropped += len(entries)
+            return False
+        return True
+
+    def _take_batch(self) -> list[dict]:
+        batch = list(self.queue.get())
+        while len(batch) < PUBLISHER_BATCH_SIZE:
+            try:
+                batch += self.queue.get_nowait()
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                self._send(batch)
+                self.published += len(batch)
+            except Exception:
+                self.errors += 1
+                logger.exception(
+                    "Не удалось отправить %s предметов в ленту", len(batch)
+                )
+
+    def _send(self, batch: list[dict]):
+        dropped = self.dropped - self._reported_dropped
+        pipe = get_redis().pipeline(transaction=False)
+        write_items(pipe, batch)
+        pipe.hset(PUBLISHER_STATS_KEY, "depth", self.queue.qsize())
+        pipe.hincrby(PUBLISHER_STATS_KEY, "published", len(batch))
+        pipe.hincrby(PUBLISHER_STATS_KEY, "dropped", dropped)
+        pipe.execute()
+        self._reported_dropped += dropped
+
+        # одна рассылка на пачку вместо опроса ленты каждым клиентом
+        async_to_sync(get_channel_layer().group_send)(
+            LIVE_TAPE_GROUP, {"type": "live_tape.items", "items": batch}
+        )
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "published": self.published,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+publisher = LiveTapePublisher()
 
-        item.update({"timestamp": time.time()})
-        new_items.append(dict(item))
 
-    for item in new_items:
-        redis_client.rpush(list_key, json.dumps(item))
+def _domain_url() -> str:
+    return get_app_cache("core", local_ttl=60).get_or_set(
+        "domain_url", lambda: GenericSettings.load().domain_url, 10 * 60
+    )
 
 
 def write_items_in_redis(user, items, case):
-    th = threading.Thread(target=task, args=(user, items, case))
-    th.start()
+    publisher.publish(build_entries(user, items, case, _domain_url()))
@@ -0,0 +1,2 @@
+from utils.redis_client.client import get_redis
+from utils.redis_client.async_client import get_async_redis
@@ -0,0 +1,25 @@
+import asyncio
+
+from django.conf import settings
+
+_pools = {}
+
+
+def get_async_redis():
+    """Асинхронный клиент Redis на общем пуле соединений.
+    Пул создаётся один раз на событийный цикл процесса
+    """
+    import aioredis
+
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = aioredis.ConnectionPool.from_url(
+            settings.REDIS_CONNECTION_STRING,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+        )
+        _pools[loop] = pool
+    return aioredis.Redis(connection_pool=pool)
@@ -0,0 +1,19 @@
+import redis
+from django.conf import settings
+
+_pool = None
+
+
+def get_redis() -> redis.Redis:
+    """Клиент Redis на общем пуле соединений процесса"""
+    global _pool
+
+    if _pool is None:
+        _pool = redis.ConnectionPool.from_url(
+            settings.REDIS_CONNECTION_STRING,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=30,
+        )
+    return redis.Redis(connection_pool=_pool)